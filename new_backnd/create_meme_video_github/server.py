@@ -5,11 +5,15 @@ Send a GitHub repo link and get back the generated video as:
 - Base64 encoded stream
 """
 
+import asyncio
 import base64
+import json
 import logging
+import math
+import os
 import re
-import tempfile
-import uuid
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 from urllib.parse import urlparse
@@ -18,33 +22,115 @@ from urllib.parse import urlparse
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse, Response, FileResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, field_validator
 from dotenv import load_dotenv
 
-from src.fetcher import fetch_readme
-from src.summarizer import summarize_readme
-from src.tts import generate_speech, VOICES, VOICE_MAPPING, DEFAULT_VOICE
-from src.captions import generate_captions_from_script
-from src.composer import compose_video, get_background_video
-from src.r2_utils import uploader
-
 # Configuration
 BASE_DIR = Path(__file__).parent.resolve()
 
-# Load environment variables
+# Load environment variables before importing src, whose modules read their
+# tuning settings at import time
 load_dotenv(BASE_DIR / ".env", override=True)
+
+from src.tts import VOICES, VOICE_MAPPING, DEFAULT_VOICE, speech_cache
+from src.admission import AdmissionController, AdmissionRejected
+from src.cache import DiskCache
+from src.events import format_sse
+from src.file_response import file_response
+from src.jobs import Job, JobManager, IdempotencyKeyConflict
+from src import metrics
+from src.pipeline import warm_up
+from src.quota import QuotaExhausted
+from src.scheduler import RENDER_WORKERS
+from src.store import JobStore
+
 OUTPUT_DIR = BASE_DIR / "output"
 OUTPUT_DIR.mkdir(exist_ok=True)
 BACKGROUNDS_DIR = BASE_DIR / "backgrounds"
 
+# Finished videos are cached by content so repeat requests skip rendering
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "5120"))
+result_cache = DiskCache(OUTPUT_DIR / "cache", max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# Intermediate stage outputs (script, narration, captions) are cached by their
+# inputs so changing one option only recomputes the stages below it
+ARTIFACT_CACHE_MAX_MB = int(os.getenv("ARTIFACT_CACHE_MAX_MB", "1024"))
+artifact_cache = DiskCache(OUTPUT_DIR / "artifacts", max_bytes=ARTIFACT_CACHE_MAX_MB * 1024 * 1024)
+
+# Chunk size used when streaming videos from disk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# New jobs are refused with 429/503 and a Retry-After estimate when the server
+# is overloaded or a single client sends too many
+admission = AdmissionController(render_slots=RENDER_WORKERS)
+
+# Render jobs run their stages on dedicated executors so the event loop stays free.
+# Jobs are recorded in SQLite and resumed from their last checkpoint after a restart.
+jobs = JobManager(
+    OUTPUT_DIR,
+    BACKGROUNDS_DIR,
+    cache=result_cache,
+    artifacts=artifact_cache,
+    admission=admission,
+    store=JobStore(OUTPUT_DIR / "jobs.db"),
+)
+
+
+def _collect_metrics() -> None:
+    """Refresh gauges and counters that mirror live server state before a scrape."""
+    metrics.ACTIVE_JOBS.set(jobs.active_jobs)
+    metrics.WORKERS.set(jobs.scheduler.network_workers, pool="network")
+    metrics.WORKERS.set(jobs.scheduler.render_workers, pool="render")
+    caches = [("result", result_cache), ("artifact", artifact_cache)]
+    if (speech := speech_cache()) is not None:
+        caches.append(("speech", speech))
+    for name, cache in caches:
+        lookups = cache.hits + cache.misses
+        # The caches keep their own running counts; the counters catch up to them
+        metrics.CACHE_HITS.inc(max(0, cache.hits - metrics.CACHE_HITS.get(cache=name)), cache=name)
+        metrics.CACHE_MISSES.inc(max(0, cache.misses - metrics.CACHE_MISSES.get(cache=name)), cache=name)
+        metrics.CACHE_HIT_RATIO.set(cache.hits / lookups if lookups else 0, cache=name)
+        metrics.CACHE_SIZE_BYTES.set(cache.size_bytes, cache=name)
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+
+async def _warm_up(app: FastAPI) -> None:
+    """Load the upstream SDKs off the event loop, then report ready."""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+        app.state.warmup_error = str(e)
+        return
+    app.state.ready = True
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The server accepts connections immediately; /ready turns 200 once the
+    # heavy SDKs are imported and the R2 client is connected
+    app.state.ready = False
+    app.state.warmup_error = None
+    jobs.start()
+    warmup = asyncio.create_task(_warm_up(app))
+    yield
+    warmup.cancel()
+    jobs.shutdown()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="GitHub Meme Video Generator API",
     description="Generate brainrot-style videos from GitHub repository READMEs",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS - Allow connections for development
@@ -77,6 +163,10 @@ class GenerateVideoRequest(BaseModel):
         default="brainrot",
         description="Subtitle style: 'brainrot' (large, rapid) or 'standard' (readable, bottom)"
     )
+    fresh: bool = Field(
+        default=False,
+        description="Write a new script instead of reusing the cached one for this README"
+    )
     
     @field_validator("github_url")
     @classmethod
@@ -118,61 +208,140 @@ class GenerateVideoRequest(BaseModel):
 #  Video Generation Logic
 # ===========================================================================
 
-def _generate_video_sync(github_url: str, voice: str, output_path: Path, subtitle_style: str = "brainrot") -> Path:
+def _submit_job(
+    request: GenerateVideoRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = None,
+    live: bool = False,
+) -> Job:
     """
-    Synchronously generate a brainrot video from a GitHub repo.
-    
-    Args:
-        github_url: Validated GitHub URL
-        voice: TTS voice name
-        output_path: Where to save the video
-        
-    Returns:
-        Path to the generated video
+    Queue a generation job, or attach to an identical one already in flight.
+
+    Raises:
+        HTTPException: If the request or idempotency key is rejected, or the
+            job is refused by admission control (with a Retry-After header)
     """
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_path = Path(temp_dir)
-        
-        # 1. Fetch README
-        print(f"Fetching README from {github_url}...")
-        readme_content = fetch_readme(github_url)
-        
-        # 2. Generate brainrot script
-        print("Generating brainrot script...")
-        script = summarize_readme(readme_content)
-
-        # Save script to file for inspection
-        try:
-            script_path = output_path.with_suffix(".txt")
-            print(f"Saving script to {script_path}...")
-            script_path.write_text(script, encoding="utf-8")
-        except Exception as e:
-            print(f"Warning: Could not save script file: {e}")
-        
-        # 3. Generate TTS audio
-        print(f"Generating speech with {voice} voice...")
-        audio_path = temp_path / "narration.wav"
-        generate_speech(script, audio_path, voice=voice)
-        
-        # 4. Generate captions
-        print("Generating captions...")
-        words = generate_captions_from_script(script, audio_path)
-        
-        # 5. Get background video
-        print("Getting background video...")
-        background_path = get_background_video(BACKGROUNDS_DIR)
-        
-        # 6. Compose final video
-        print(f"Composing video to {output_path}...")
-        compose_video(
-            background_path=background_path,
-            audio_path=audio_path,
-            words=words,
-            output_path=output_path,
-            subtitle_style=subtitle_style,
+    # Behind a proxy, run uvicorn with --proxy-headers so this is the real client
+    client_id = http_request.client.host if http_request.client else None
+    try:
+        return jobs.submit(
+            github_url=request.github_url,
+            voice=request.voice,
+            subtitle_style=request.subtitle_style,
+            idempotency_key=idempotency_key,
+            live=live,
+            client_id=client_id,
+            fresh=request.fresh,
         )
-        
-        return output_path
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AdmissionRejected as e:
+        metrics.ADMISSION_REJECTIONS.inc(status=str(e.status_code))
+        logger.warning(f"Admission: Rejected request from {client_id} ({e.status_code}): {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+async def _run_job(
+    request: GenerateVideoRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = None,
+) -> Job:
+    """
+    Queue a generation job and wait for it without blocking the event loop.
+
+    Raises:
+        HTTPException: If the job was rejected or failed
+    """
+    return await _await_job(_submit_job(request, http_request, idempotency_key))
+
+
+async def _await_job(job: Job) -> Job:
+    """
+    Wait for a submitted job to finish.
+
+    Raises:
+        HTTPException: If the job failed
+    """
+    await jobs.wait(job)
+
+    if job.status == "failed":
+        _raise_job_error(job)
+
+    if not job.output_path.exists():
+        raise HTTPException(status_code=500, detail="Video generation failed - file not created")
+
+    return job
+
+
+async def _wait_for_compose(job: Job) -> None:
+    """
+    Wait until a live job starts encoding or finishes without encoding.
+
+    Raises:
+        HTTPException: If the job failed before encoding started
+    """
+    waiters = {
+        asyncio.create_task(job.live.started.wait()),
+        asyncio.create_task(job.done.wait()),
+    }
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+    if job.status == "failed" and not job.live.started.is_set():
+        _raise_job_error(job)
+
+
+def _raise_job_error(job: Job) -> None:
+    """Translate a failed job into the matching HTTP error."""
+    if isinstance(job.exception, ValueError):
+        raise HTTPException(status_code=400, detail=job.error)
+    if isinstance(job.exception, QuotaExhausted):
+        raise HTTPException(
+            status_code=503,
+            detail=job.error,
+            headers={"Retry-After": str(math.ceil(job.exception.retry_after))},
+        )
+    if "429" in job.error or "RESOURCE_EXHAUSTED" in job.error:
+        raise HTTPException(
+            status_code=429,
+            detail="Daily AI limit reached. Please try again tomorrow or upgrade your plan."
+        )
+    raise HTTPException(status_code=500, detail=f"Video generation failed: {job.error}")
+
+
+def _iter_file(file, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Yield an open binary file in chunks, closing it when done."""
+    with file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+def _iter_base64(file, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yield an open binary file as base64 in chunks, closing it when done.
+
+    Chunks are encoded on 3-byte boundaries so they concatenate into exactly
+    the same text as encoding the whole file at once.
+    """
+    chunk_size -= chunk_size % 3
+    leftover = b""
+    for chunk in _iter_file(file, chunk_size):
+        chunk = leftover + chunk
+        usable = len(chunk) - len(chunk) % 3
+        leftover = chunk[usable:]
+        if usable:
+            yield base64.b64encode(chunk[:usable])
+    if leftover:
+        yield base64.b64encode(leftover)
 
 
 # ===========================================================================
@@ -197,9 +366,46 @@ async def health():
         "status": "healthy",
         "backgrounds_available": bg_available,
         "output_dir_exists": OUTPUT_DIR.exists(),
+        "result_cache": {
+            "size_bytes": result_cache.size_bytes,
+            "max_bytes": result_cache.max_bytes,
+            "hits": result_cache.hits,
+            "misses": result_cache.misses,
+        },
+        "artifact_cache": {
+            "size_bytes": artifact_cache.size_bytes,
+            "max_bytes": artifact_cache.max_bytes,
+            "hits": artifact_cache.hits,
+            "misses": artifact_cache.misses,
+        },
+        "admission": {
+            "active_jobs": jobs.active_jobs,
+            "max_active_jobs": admission.max_active_jobs,
+            "predicted_latency_seconds": round(admission.predicted_latency(jobs.active_jobs), 1),
+            "latency_budget_seconds": admission.latency_budget,
+            "stage_seconds": admission.timings.snapshot(),
+        },
     }
 
 
+@app.get("/ready", tags=["Health"])
+async def ready(http_request: Request):
+    """Readiness probe: 503 until start-up warm-up has finished, then 200."""
+    state = http_request.app.state
+    if not state.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "failed" if state.warmup_error else "starting", "error": state.warmup_error},
+        )
+    return {"status": "ready"}
+
+
+@app.get("/metrics", tags=["Health"])
+async def get_metrics():
+    """Prometheus metrics: stage latencies, upstream errors, FFmpeg throughput, queues and caches."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/voices", tags=["Config"])
 async def get_voices():
     """Get available TTS voices."""
@@ -210,225 +416,283 @@ async def get_voices():
     }
 
 
-@app.post("/generate", tags=["Video Generation"])
-async def generate_video(request: GenerateVideoRequest):
+@app.post("/jobs", tags=["Jobs"], status_code=202)
+async def create_job(
+    request: GenerateVideoRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(default=None),
+):
     """
-    Generate a brainrot video from a GitHub repo and return it as a file download.
-    
-    This endpoint blocks until video generation is complete, then returns the video
-    as an MP4 file for download.
+    Queue a video generation job and return its id immediately.
+
+    Poll `GET /jobs/{job_id}` for status; once completed, download the video
+    from `GET /jobs/{job_id}/video`. Identical requests that arrive while a job
+    is in flight get that job's id, and resending the same `Idempotency-Key`
+    returns the original job.
     """
-    job_id = str(uuid.uuid4())[:8]
-    output_path = OUTPUT_DIR / f"{job_id}.mp4"
-    
+    job = _submit_job(request, http_request, idempotency_key)
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str):
+    """Get the status and result of a video generation job."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/events", tags=["Jobs"])
+async def get_job_events(job_id: str):
+    """
+    Stream job events as Server-Sent Events.
+
+    - `status`: the job document, when the job starts and when it finishes
+    - `stage`: a pipeline stage `started`, `completed` (with wall time in
+      `seconds`), `failed` or served from cache (`cached`)
+    - `progress`: FFmpeg encode progress with `fps`, `speed`, `out_time`,
+      `percent` and `eta`
+
+    Events already emitted are replayed first. The stream ends after the final
+    `status` event.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def iterevents():
+        async for item in job.events.subscribe():
+            if item is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield format_sse(*item)
+
+    return StreamingResponse(
+        iterevents(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+@app.get("/jobs/{job_id}/video", tags=["Jobs"])
+async def get_job_video(job_id: str, http_request: Request):
+    """
+    Download the video produced by a completed job.
+
+    Supports `Range` requests for seeking and `If-None-Match` /
+    `If-Modified-Since` revalidation, so players only fetch what they need.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
     try:
-        _generate_video_sync(
-            github_url=request.github_url,
-            voice=request.voice,
-            output_path=output_path,
-            subtitle_style=request.subtitle_style,
-        )
-        
-        if not output_path.exists():
-            raise HTTPException(status_code=500, detail="Video generation failed - file not created")
-        
-        r2_url = uploader.upload_file(output_path)
-        
-        return FileResponse(
-            path=str(output_path),
+        return await file_response(
+            http_request,
+            job.output_path,
             media_type="video/mp4",
-            filename=f"brainrot_{job_id}.mp4",
             headers={
-                "Content-Disposition": f'attachment; filename="brainrot_{job_id}.mp4"',
-                "X-R2-URL": r2_url or ""
+                "Content-Disposition": f'attachment; filename="brainrot_{job.id}.mp4"',
+                "X-R2-URL": job.r2_url or ""
             }
         )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        error_msg = str(e)
-        if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-            raise HTTPException(
-                status_code=429, 
-                detail="Daily AI limit reached. Please try again tomorrow or upgrade your plan."
-            )
-        raise HTTPException(status_code=500, detail=f"Video generation failed: {error_msg}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Video is no longer available")
+
+
+@app.post("/generate", tags=["Video Generation"])
+async def generate_video(
+    request: GenerateVideoRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(default=None),
+):
+    """
+    Generate a brainrot video from a GitHub repo and return it as a file download.
+    
+    This endpoint waits until video generation is complete, then returns the video
+    as an MP4 file for download. Rendering happens on the job executors, so other
+    requests are still served in the meantime.
+    """
+    job = await _run_job(request, http_request, idempotency_key)
+    job_id = job.id
+
+    return await file_response(
+        http_request,
+        job.output_path,
+        media_type="video/mp4",
+        headers={
+            "Content-Disposition": f'attachment; filename="brainrot_{job_id}.mp4"',
+            "X-R2-URL": job.r2_url or ""
+        }
+    )
 
 
 @app.post("/generate/base64", tags=["Video Generation"])
-async def generate_video_base64(request: GenerateVideoRequest):
+async def generate_video_base64(
+    request: GenerateVideoRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(default=None),
+):
     """
     Generate a brainrot video and return it as base64-encoded data.
     
     Returns JSON with the video encoded as a base64 string.
     This is suitable for API consumers that need the raw video data.
     """
-    job_id = str(uuid.uuid4())[:8]
-    output_path = OUTPUT_DIR / f"{job_id}.mp4"
-    
-    try:
-        _generate_video_sync(
-            github_url=request.github_url,
-            voice=request.voice,
-            output_path=output_path,
-            subtitle_style=request.subtitle_style,
-        )
-        
-        if not output_path.exists():
-            raise HTTPException(status_code=500, detail="Video generation failed - file not created")
-        
-        # Upload to R2 before cleanup
-        r2_url = uploader.upload_file(output_path)
-        
-        # Read and encode as base64
-        video_bytes = output_path.read_bytes()
-        video_base64 = base64.b64encode(video_bytes).decode("utf-8")
-        
-        # Clean up file after reading
-        output_path.unlink()
-        
-        return {
-            "job_id": job_id,
-            "status": "completed",
-            "content_type": "video/mp4",
-            "video_base64": video_base64,
-            "size_bytes": len(video_bytes),
-            "r2_url": r2_url
+    job = await _run_job(request, http_request, idempotency_key)
+
+    video_file = open(job.output_path, "rb")
+    video_size = os.fstat(video_file.fileno()).st_size
+
+    # The JSON envelope is written around the base64 payload, which is encoded
+    # chunk by chunk straight from the file. Neither the video nor its encoding
+    # is ever held in memory as a whole.
+    head = json.dumps({
+        "job_id": job.id,
+        "status": "completed",
+        "content_type": "video/mp4",
+    }, separators=(",", ":"))[:-1] + ',"video_base64":"'
+    tail = '",' + json.dumps({
+        "size_bytes": video_size,
+        "r2_url": job.r2_url,
+    }, separators=(",", ":"))[1:]
+
+    head_bytes = head.encode("utf-8")
+    tail_bytes = tail.encode("utf-8")
+    encoded_size = 4 * ((video_size + 2) // 3)
+
+    def iterbody():
+        yield head_bytes
+        yield from _iter_base64(video_file)
+        yield tail_bytes
+
+    return StreamingResponse(
+        iterbody(),
+        media_type="application/json",
+        headers={
+            "Content-Length": str(len(head_bytes) + encoded_size + len(tail_bytes)),
+            "X-Job-Id": job.id,
         }
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Video generation failed: {str(e)}")
+    )
 
 
 @app.post("/generate/stream", tags=["Video Generation"])
-async def generate_video_stream(request: GenerateVideoRequest):
+async def generate_video_stream(
+    request: GenerateVideoRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(default=None),
+    live: bool = False,
+):
     """
     Generate a brainrot video and stream it back as a response.
     
     Returns the raw video bytes as a streaming response.
     This is the most efficient for large files.
+
+    With `?live=true` the video is encoded as fragmented MP4 and forwarded while
+    FFmpeg is still running, so the first bytes arrive after about one keyframe
+    interval instead of after the whole encode. The finished file is still saved
+    and uploaded to R2 in the background.
     """
-    job_id = str(uuid.uuid4())[:8]
-    output_path = OUTPUT_DIR / f"{job_id}.mp4"
-    
-    try:
-        _generate_video_sync(
-            github_url=request.github_url,
-            voice=request.voice,
-            output_path=output_path,
-            subtitle_style=request.subtitle_style,
-        )
-        
-        if not output_path.exists():
-            raise HTTPException(status_code=500, detail="Video generation failed - file not created")
-        
-        # Upload to R2
-        r2_url = uploader.upload_file(output_path)
-        
-        def iterfile():
-            with open(output_path, "rb") as f:
-                while chunk := f.read(8192):  # 8KB chunks
-                    yield chunk
-            # Clean up after streaming
-            output_path.unlink()
-        
-        file_size = output_path.stat().st_size
-        
-        return StreamingResponse(
-            iterfile(),
-            media_type="video/mp4",
-            headers={
-                "Content-Disposition": f'attachment; filename="brainrot_{job_id}.mp4"',
-                "Content-Length": str(file_size),
-                "X-Job-Id": job_id,
-                "X-R2-URL": r2_url or ""
-            }
-        )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Video generation failed: {str(e)}")
+    if live:
+        job = _submit_job(request, http_request, idempotency_key, live=True)
+        if job.live is not None and not job.finished:
+            await _wait_for_compose(job)
+        if job.live is not None and job.live.started.is_set():
+            return StreamingResponse(
+                job.live.iter_chunks(STREAM_CHUNK_SIZE),
+                media_type="video/mp4",
+                headers={
+                    "Content-Disposition": f'attachment; filename="brainrot_{job.id}.mp4"',
+                    "X-Job-Id": job.id,
+                }
+            )
+        # Served from cache, or attached to a job that is not rendering live
+        job = await _await_job(job)
+    else:
+        job = await _run_job(request, http_request, idempotency_key)
+    job_id = job.id
+    output_path = job.output_path
+
+    video_file = open(output_path, "rb")
+    file_size = os.fstat(video_file.fileno()).st_size
+
+    return StreamingResponse(
+        _iter_file(video_file),
+        media_type="video/mp4",
+        headers={
+            "Content-Disposition": f'attachment; filename="brainrot_{job_id}.mp4"',
+            "Content-Length": str(file_size),
+            "X-Job-Id": job_id,
+            "X-R2-URL": job.r2_url or ""
+        }
+    )
 
 
 @app.post("/generate/multipart", tags=["Video Generation"])
-async def generate_video_multipart(request: GenerateVideoRequest):
+async def generate_video_multipart(
+    request: GenerateVideoRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(default=None),
+):
     """
     Generate a brainrot video and return it as multipart form data.
     
     This returns the video along with metadata in a multipart response,
     which is useful for Postman testing and form-based clients.
     """
-    job_id = str(uuid.uuid4())[:8]
-    output_path = OUTPUT_DIR / f"{job_id}.mp4"
-    
-    try:
-        _generate_video_sync(
-            github_url=request.github_url,
-            voice=request.voice,
-            output_path=output_path,
-            subtitle_style=request.subtitle_style,
-        )
-        
-        if not output_path.exists():
-            raise HTTPException(status_code=500, detail="Video generation failed - file not created")
-        
-        # Upload to R2
-        r2_url = uploader.upload_file(output_path)
-        
-        # Read video data
-        video_bytes = output_path.read_bytes()
-        
-        # Create multipart boundary
-        boundary = f"----BrainrotBoundary{job_id}"
-        
-        # Build multipart body
-        body_parts = []
-        
-        # Part 1: Metadata (JSON)
-        metadata = {
-            "job_id": job_id,
-            "status": "completed",
-            "filename": f"brainrot_{job_id}.mp4",
-            "size_bytes": len(video_bytes),
-            "r2_url": r2_url
+    job = await _run_job(request, http_request, idempotency_key)
+    job_id = job.id
+    r2_url = job.r2_url
+
+    # Open before sizing so the length matches what is streamed, even if the
+    # cached file is evicted in the meantime
+    video_file = open(job.output_path, "rb")
+    video_size = os.fstat(video_file.fileno()).st_size
+
+    # Create multipart boundary
+    boundary = f"----BrainrotBoundary{job_id}"
+
+    # Build multipart body
+    body_parts = []
+
+    # Part 1: Metadata (JSON)
+    body_parts.append(f"--{boundary}\r\n")
+    body_parts.append('Content-Disposition: form-data; name="metadata"\r\n')
+    body_parts.append("Content-Type: application/json\r\n\r\n")
+    body_parts.append(f'{{"job_id": "{job_id}", "status": "completed", "filename": "brainrot_{job_id}.mp4", "size_bytes": {video_size}, "r2_url": "{r2_url}"}}\r\n')
+
+    # Part 2: Video file
+    body_parts.append(f"--{boundary}\r\n")
+    body_parts.append(f'Content-Disposition: form-data; name="video"; filename="brainrot_{job_id}.mp4"\r\n')
+    body_parts.append("Content-Type: video/mp4\r\n\r\n")
+
+    # Combine text parts
+    text_body = "".join(body_parts).encode("utf-8")
+    end_boundary = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+    def iterbody():
+        # Text header, then the video straight from disk, then the end boundary,
+        # so the whole video is never held in memory
+        yield text_body
+        yield from _iter_file(video_file)
+        yield end_boundary
+
+    return StreamingResponse(
+        iterbody(),
+        media_type=f"multipart/form-data; boundary={boundary}",
+        headers={
+            "Content-Length": str(len(text_body) + video_size + len(end_boundary)),
+            "X-Job-Id": job_id,
+            "X-R2-URL": r2_url or ""
         }
-        body_parts.append(f"--{boundary}\r\n")
-        body_parts.append('Content-Disposition: form-data; name="metadata"\r\n')
-        body_parts.append("Content-Type: application/json\r\n\r\n")
-        body_parts.append(f'{{"job_id": "{job_id}", "status": "completed", "filename": "brainrot_{job_id}.mp4", "size_bytes": {len(video_bytes)}, "r2_url": "{r2_url}"}}\r\n')
-        
-        # Part 2: Video file
-        body_parts.append(f"--{boundary}\r\n")
-        body_parts.append(f'Content-Disposition: form-data; name="video"; filename="brainrot_{job_id}.mp4"\r\n')
-        body_parts.append("Content-Type: video/mp4\r\n\r\n")
-        
-        # Combine text parts
-        text_body = "".join(body_parts).encode("utf-8")
-        end_boundary = f"\r\n--{boundary}--\r\n".encode("utf-8")
-        
-        # Full body: text header + video bytes + end boundary
-        full_body = text_body + video_bytes + end_boundary
-        
-        # Clean up file
-        output_path.unlink()
-        
-        return Response(
-            content=full_body,
-            media_type=f"multipart/form-data; boundary={boundary}",
-            headers={
-                "X-Job-Id": job_id,
-                "X-R2-URL": r2_url or ""
-            }
-        )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Video generation failed: {str(e)}")
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+"""Admission control: queue-depth backpressure and per-client rate limits."""
+
+import math
+import os
+import threading
+import time
+
+# Hard cap on jobs that are queued or running at once
+MAX_ACTIVE_JOBS = int(os.getenv("MAX_ACTIVE_JOBS", "20"))
+
+# Reject new jobs whose predicted end-to-end latency exceeds this many seconds
+LATENCY_BUDGET_SECONDS = float(os.getenv("LATENCY_BUDGET_SECONDS", "300"))
+
+# Per-client token bucket: sustained jobs per minute and burst size
+CLIENT_JOBS_PER_MINUTE = float(os.getenv("CLIENT_JOBS_PER_MINUTE", "6"))
+CLIENT_BURST = int(os.getenv("CLIENT_BURST", "3"))
+
+# Starting estimates (seconds) used until real timings have been observed
+DEFAULT_STAGE_SECONDS = {
+    "fetch": 1.0,
+    "summarize": 10.0,
+    "tts": 15.0,
+    "captions": 0.5,
+    "compose": 30.0,
+    "upload": 3.0,
+}
+
+# Weight of the newest observation in the moving averages
+SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    """A job was refused; the client should retry after retry_after seconds."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class StageTimings:
+    """Exponential moving average of recent wall time per pipeline stage."""
+
+    def __init__(self):
+        self._seconds = dict(DEFAULT_STAGE_SECONDS)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            previous = self._seconds.get(stage, seconds)
+            self._seconds[stage] = previous + SMOOTHING * (seconds - previous)
+
+    def get(self, stage: str) -> float:
+        return self._seconds.get(stage, 0.0)
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return {stage: round(seconds, 3) for stage, seconds in self._seconds.items()}
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """
+        Take one token.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one is available
+        """
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def give_back(self) -> None:
+        """Return a token taken for work that turned out to cost nothing."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class AdmissionController:
+    """
+    Decides whether a new job may start.
+
+    Jobs are refused with 503 when the queue is full or the predicted latency
+    would blow the budget, and with 429 when one client exceeds its rate. Both
+    carry a Retry-After estimate built from recent stage timings.
+    """
+
+    def __init__(
+        self,
+        render_slots: int,
+        max_active_jobs: int = MAX_ACTIVE_JOBS,
+        latency_budget: float = LATENCY_BUDGET_SECONDS,
+        client_jobs_per_minute: float = CLIENT_JOBS_PER_MINUTE,
+        client_burst: int = CLIENT_BURST,
+    ):
+        self.render_slots = max(1, render_slots)
+        self.max_active_jobs = max_active_jobs
+        self.latency_budget = latency_budget
+        self.client_rate = client_jobs_per_minute / 60
+        self.client_burst = client_burst
+        self.timings = StageTimings()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def predicted_latency(self, active_jobs: int) -> float:
+        """
+        Estimate how long a new job would take with `active_jobs` ahead of it.
+
+        FFmpeg is the bottleneck: jobs ahead drain through the render slots one
+        compose at a time, while the network stages of different jobs overlap.
+        """
+        compose = self.timings.get("compose")
+        network = sum(
+            self.timings.get(stage)
+            for stage in ("fetch", "summarize", "tts", "captions", "upload")
+        )
+        queue_wait = max(0.0, active_jobs / self.render_slots * compose - network)
+        return queue_wait + network + compose
+
+    def admit(self, client_id: str | None, active_jobs: int, cached: bool = False) -> None:
+        """
+        Admit a new job or refuse it.
+
+        Args:
+            client_id: Client whose rate the job counts against
+            active_jobs: Jobs queued or running
+            cached: The job will most likely be served from the result cache.
+                It renders nothing, so queue depth and predicted latency do
+                not apply; the client rate still does until refund().
+
+        Raises:
+            AdmissionRejected: With status 429 or 503 and a Retry-After estimate
+        """
+        if not cached:
+            self._check_capacity(active_jobs)
+
+        if client_id is None or self.client_rate <= 0:
+            return
+
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                self._prune_buckets()
+                bucket = self._buckets[client_id] = TokenBucket(self.client_rate, self.client_burst)
+            wait = bucket.take()
+
+        if wait > 0:
+            raise AdmissionRejected(
+                429,
+                "Too many video requests from this client. Please slow down.",
+                wait,
+            )
+
+    def _check_capacity(self, active_jobs: int) -> None:
+        compose = self.timings.get("compose")
+
+        if active_jobs >= self.max_active_jobs:
+            excess = active_jobs - self.max_active_jobs + 1
+            raise AdmissionRejected(
+                503,
+                "Server is at capacity. Please retry later.",
+                math.ceil(excess / self.render_slots) * compose,
+            )
+
+        predicted = self.predicted_latency(active_jobs)
+        if predicted > self.latency_budget:
+            raise AdmissionRejected(
+                503,
+                f"Server is busy (predicted wait {predicted:.0f}s). Please retry later.",
+                predicted - self.latency_budget,
+            )
+
+    def refund(self, client_id: str | None) -> None:
+        """Give a client back the token of a job that was served from the result cache."""
+        if client_id is None:
+            return
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is not None:
+                bucket.give_back()
+
+    def _prune_buckets(self) -> None:
+        """Forget clients whose buckets have refilled completely."""
+        if len(self._buckets) < 1024:
+            return
+        self._buckets = {
+            client_id: bucket for client_id, bucket in self._buckets.items()
+            if not bucket.is_full()
+        }
@@ -0,0 +1,312 @@
+"""Content-addressed on-disk cache with a byte quota and LRU eviction."""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# How long a hit's access time may sit in memory before it is written to the
+# index. Eviction order is only ever this far behind.
+ACCESS_FLUSH_SECONDS = 30.0
+
+# Files on their way into the cache, and how old one must be to count as left
+# behind by a crash
+INCOMING_PREFIX = ".incoming-"
+INCOMING_STALE_SECONDS = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    suffixes TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    meta TEXT NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+"""
+
+
+class DiskCache:
+    """
+    Files stored under a content key, evicted least-recently-used past a byte quota.
+
+    Each entry is one or more files named ``{key}{suffix}`` plus a small metadata
+    dict. The index is a SQLite database next to the files, so entries survive a
+    restart and every process sharing the directory sees the same entries and
+    the same quota.
+
+    Files are only renamed into place or removed inside a write transaction on
+    the index, so the index and the directory agree across processes. Reads
+    take no lock: a reader that loses a race with an eviction sees a miss.
+    Each thread has its own connection, so a lookup never waits for another
+    thread's write.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._db_path = self.root / "index.db"
+        self._local = threading.local()
+        # Guards the counters and the unflushed access times, never any I/O
+        self._lock = threading.Lock()
+        self._accessed: dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+        self._connect().executescript(SCHEMA)
+        self._import_json_index()
+        self._remove_stale_incoming()
+        with self._transaction() as db:
+            self._drop_missing(db)
+            self._evict(db)
+
+    def path(self, key: str, suffix: str) -> Path:
+        """Location of one file of an entry."""
+        return self.root / f"{key}{suffix}"
+
+    @property
+    def size_bytes(self) -> int:
+        return self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> dict | None:
+        """
+        Look up an entry and mark it as recently used.
+
+        Returns:
+            The entry's metadata, or None on a miss
+        """
+        entry = self._lookup(key)
+        return entry["meta"] if entry is not None else None
+
+    def read(self, key: str, suffix: str) -> bytes | None:
+        """
+        Look up an entry and return the contents of one of its files.
+
+        Returns:
+            The file's bytes, or None on a miss
+        """
+        if self._lookup(key) is None:
+            return None
+        try:
+            return self.path(key, suffix).read_bytes()
+        except FileNotFoundError:
+            self._lost(key)
+            return None
+
+    def get_copy(self, key: str, dest_dir: Path) -> dict[str, Path] | None:
+        """
+        Look up an entry and copy its files into dest_dir.
+
+        An eviction that removes the files mid-copy, in this process or
+        another, turns the lookup into a miss.
+
+        Returns:
+            Mapping of suffix to the copied file, or None on a miss
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+
+        copies = {}
+        try:
+            for suffix in entry["suffixes"]:
+                copies[suffix] = Path(dest_dir) / f"{key}{suffix}"
+                shutil.copyfile(self.path(key, suffix), copies[suffix])
+        except FileNotFoundError:
+            for copy in copies.values():
+                copy.unlink(missing_ok=True)
+            self._lost(key)
+            return None
+        return copies
+
+    def put(self, key: str, files: dict[str, Path], meta: dict | None = None, copy: bool = False) -> None:
+        """
+        Move files into the cache under a key.
+
+        Args:
+            key: Content key of the entry
+            files: Mapping of suffix to the file to move in (e.g. {".mp4": path})
+            meta: JSON-serializable metadata returned by get()
+            copy: Copy the files instead of moving them
+        """
+        # Bring the files into the cache directory first, outside the
+        # transaction, so that making them visible is only a rename
+        staged: dict[str, Path] = {}
+        try:
+            for suffix, source in files.items():
+                staged[suffix] = self.root / f"{INCOMING_PREFIX}{uuid.uuid4().hex}{suffix}"
+                if copy:
+                    shutil.copyfile(source, staged[suffix])
+                else:
+                    shutil.move(str(source), staged[suffix])
+            size = sum(path.stat().st_size for path in staged.values())
+
+            with self._transaction() as db:
+                row = db.execute("SELECT suffixes FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remove_files(key, set(json.loads(row[0])) - staged.keys())
+                for suffix, path in staged.items():
+                    os.replace(path, self.path(key, suffix))
+                db.execute(
+                    "INSERT OR REPLACE INTO entries (key, suffixes, size, meta, last_access)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, json.dumps(list(staged)), size, json.dumps(meta or {}), time.time()),
+                )
+                self._evict(db, keep=key)
+        finally:
+            for path in staged.values():
+                path.unlink(missing_ok=True)
+
+    def update_meta(self, key: str, **meta) -> None:
+        """Merge fields into an existing entry's metadata."""
+        with self._transaction() as db:
+            row = db.execute("SELECT meta FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            db.execute(
+                "UPDATE entries SET meta = ? WHERE key = ?",
+                (json.dumps({**json.loads(row[0]), **meta}), key),
+            )
+
+    def _lookup(self, key: str) -> dict | None:
+        """Find an entry whose files are all present, counting the hit or miss."""
+        row = self._connect().execute(
+            "SELECT suffixes, meta FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        entry = {"suffixes": json.loads(row[0]), "meta": json.loads(row[1])} if row else None
+        if entry is not None and not self._files_exist(key, entry["suffixes"]):
+            self._drop_if_missing(key)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._accessed[key] = time.time()
+            flush = time.monotonic() - self._flushed_at >= ACCESS_FLUSH_SECONDS
+        if flush:
+            with self._transaction() as db:
+                self._flush_access(db)
+        return entry
+
+    def _lost(self, key: str) -> None:
+        """Turn a hit whose files vanished after the lookup into a miss."""
+        self._drop_if_missing(key)
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self._db_path, isolation_level=None, timeout=30)
+            # WAL lets lookups read while another process writes
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """A write transaction; only one process at a time may hold it."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _flush_access(self, db: sqlite3.Connection) -> None:
+        """Write the access times of recent hits to the index."""
+        with self._lock:
+            accessed, self._accessed = self._accessed, {}
+            self._flushed_at = time.monotonic()
+        db.executemany(
+            "UPDATE entries SET last_access = MAX(last_access, ?) WHERE key = ?",
+            [(at, key) for key, at in accessed.items()],
+        )
+
+    def _files_exist(self, key: str, suffixes: list[str]) -> bool:
+        return all(self.path(key, suffix).exists() for suffix in suffixes)
+
+    def _remove_files(self, key: str, suffixes) -> None:
+        for suffix in suffixes:
+            self.path(key, suffix).unlink(missing_ok=True)
+
+    def _drop_if_missing(self, key: str) -> None:
+        """Drop an entry if its files are incomplete, checked again under the write lock."""
+        with self._transaction() as db:
+            row = db.execute("SELECT suffixes FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and not self._files_exist(key, json.loads(row[0])):
+                logger.warning(f"Cache: Entry {key[:12]} lost its files, dropping it")
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._remove_files(key, json.loads(row[0]))
+
+    def _drop_missing(self, db: sqlite3.Connection) -> None:
+        """Drop every entry whose files are incomplete, e.g. after a crash or a manual cleanup."""
+        for key, suffixes in db.execute("SELECT key, suffixes FROM entries").fetchall():
+            if not self._files_exist(key, json.loads(suffixes)):
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._remove_files(key, json.loads(suffixes))
+
+    def _evict(self, db: sqlite3.Connection, keep: str | None = None) -> None:
+        """Drop least-recently-used entries until the cache fits its quota."""
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        self._flush_access(db)
+        rows = db.execute("SELECT key, suffixes, size FROM entries ORDER BY last_access").fetchall()
+        for key, suffixes, size in rows:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._remove_files(key, json.loads(suffixes))
+            total -= size
+            logger.info(f"Cache: Evicted {key[:12]} ({size} bytes)")
+
+    def _remove_stale_incoming(self) -> None:
+        cutoff = time.time() - INCOMING_STALE_SECONDS
+        for path in self.root.glob(f"{INCOMING_PREFIX}*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _import_json_index(self) -> None:
+        """Carry entries over from the JSON index used before the SQLite one."""
+        json_path = self.root / "index.json"
+        try:
+            data = json.loads(json_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            logger.warning(f"Cache: Could not read old index {json_path}: {e}")
+            data = {}
+
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO entries (key, suffixes, size, meta, last_access) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (key, json.dumps(entry["suffixes"]), entry["size"], json.dumps(entry["meta"]), entry["last_access"])
+                    for key, entry in data.items()
+                ],
+            )
+        json_path.unlink(missing_ok=True)
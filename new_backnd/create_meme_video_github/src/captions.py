@@ -117,8 +117,10 @@ def _get_audio_duration(audio_path: Path) -> float | None:
 
 def generate_captions_from_script(
     script: str,
-    audio_path: str | Path,
+    audio_path: str | Path | None,
     output_path: str | Path | None = None,
+    spans: list[dict] | None = None,
+    duration: float | None = None,
 ) -> list[dict]:
     """
     Generate word-level captions by distributing script words across audio duration.
@@ -126,39 +128,50 @@ def generate_captions_from_script(
 
     Args:
         script: The text that was spoken
-        audio_path: Path to the audio file
+        audio_path: Path to the audio file, probed for its duration when
+            neither spans nor duration are given
         output_path: Optional path to save SRT file
+        spans: Where each TTS chunk is spoken ({"text", "start", "end"}, see
+            tts.span_records). Words are then spread within their own chunk,
+            so timing errors no longer build up over the whole script.
+        duration: Audio length in seconds, if already known
 
     Returns:
         List of caption segments with timing info
     """
-    audio_path = Path(audio_path)
-    duration = _get_audio_duration(audio_path) or 60.0
+    if spans:
+        words = []
+        for span in spans:
+            words.extend(_spread_words(span["text"].split(), span["start"], span["end"]))
+    else:
+        if duration is None:
+            duration = _get_audio_duration(Path(audio_path)) or 60.0
+
+        # Split script into words and distribute them evenly across duration
+        words = _spread_words(script.split(), 0.0, duration)
+
+    # Generate SRT if output path provided
+    if output_path:
+        output_path = Path(output_path)
+        srt_content = generate_srt(words)
+        output_path.write_text(srt_content)
+
+    return words
 
-    # Split script into words
-    script_words = script.split()
+
+def _spread_words(script_words: list[str], start: float, end: float) -> list[dict]:
+    """Time words evenly between start and end."""
     if not script_words:
         return []
-
-    # Distribute words evenly across duration
-    time_per_word = duration / len(script_words)
+    time_per_word = (end - start) / len(script_words)
 
     words = []
     for i, word in enumerate(script_words):
-        start = i * time_per_word
-        end = min((i + 1) * time_per_word, duration)
         words.append({
             "word": word,
-            "start": start,
-            "end": end,
+            "start": start + i * time_per_word,
+            "end": min(start + (i + 1) * time_per_word, end),
         })
-
-    # Generate SRT if output path provided
-    if output_path:
-        output_path = Path(output_path)
-        srt_content = generate_srt(words)
-        output_path.write_text(srt_content)
-
     return words
 
 
@@ -0,0 +1,60 @@
+"""Process-wide upstream clients with pooled keep-alive connections."""
+
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+    from google import genai
+
+logger = logging.getLogger(__name__)
+
+# Keep-alive connections held open to each upstream. Sized to the network
+# stage pool by default so every worker thread can have its own connection.
+HTTP_POOL_SIZE = max(1, int(os.getenv("HTTP_POOL_SIZE", os.getenv("NETWORK_WORKERS", "32"))))
+
+_lock = threading.Lock()
+_github_session: "requests.Session | None" = None
+_gemini_client: "genai.Client | None" = None
+
+
+def github_session() -> "requests.Session":
+    """Shared requests session for GitHub, created on first use."""
+    global _github_session
+    with _lock:
+        if _github_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _github_session = session
+        return _github_session
+
+
+def gemini_client() -> "genai.Client":
+    """Shared Gemini client, created on first use."""
+    global _gemini_client
+    with _lock:
+        if _gemini_client is None:
+            import httpx
+            from google import genai
+            from google.genai import types
+
+            logger.info(f"Clients: Creating Gemini client with {HTTP_POOL_SIZE} pooled connections")
+            _gemini_client = genai.Client(
+                api_key=os.environ.get("GEMINI_API_KEY"),
+                http_options=types.HttpOptions(
+                    client_args={
+                        "limits": httpx.Limits(
+                            max_connections=HTTP_POOL_SIZE,
+                            max_keepalive_connections=HTTP_POOL_SIZE,
+                        ),
+                    },
+                ),
+            )
+        return _gemini_client
@@ -0,0 +1,190 @@
+"""Shrink a README to the parts worth summarizing before it is sent to Gemini."""
+
+import re
+from typing import Iterable, Iterator
+
+# Characters of README text the summarizer sends to the model
+MAX_README_CHARS = 15000
+
+# Lines kept from the start of each fenced code block
+CODE_EXCERPT_LINES = 6
+
+# Rows kept from each table, after the header
+TABLE_ROWS = 10
+
+# Sections that rarely say anything about what the project does
+SKIPPED_SECTIONS = re.compile(
+    r"^(licen[cs]e|contributors?|contributing|acknowledge?ments?|credits|sponsors?|backers|"
+    r"citation|citing|changelog|star history|stargazers|table of contents|contents|toc)\b",
+    re.IGNORECASE,
+)
+
+FENCE = re.compile(r"^\s*(`{3,}|~{3,})\s*([\w+-]*)")
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+BADGE = re.compile(r"\[!\[[^\]]*\]\([^)]*\)\]\([^)]*\)")
+IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+LINK_DEFINITION = re.compile(r"^\s*\[[^\]]+\]:\s*\S+")
+# Only real HTML tags are stripped, so generics like Option<T> survive
+HTML_TAGS = (
+    "a", "abbr", "article", "audio", "b", "blockquote", "br", "caption", "center", "cite",
+    "code", "col", "colgroup", "dd", "del", "details", "div", "dl", "dt", "em", "figcaption",
+    "figure", "font", "footer", "h[1-6]", "header", "hr", "i", "iframe", "img", "input",
+    "ins", "kbd", "label", "li", "main", "mark", "nav", "ol", "p", "picture", "pre", "q",
+    "s", "section", "small", "source", "span", "strike", "strong", "sub", "summary", "sup",
+    "svg", "table", "tbody", "td", "th", "thead", "tr", "tt", "u", "ul", "video",
+)
+_TAG_NAME = "(?:" + "|".join(HTML_TAGS) + ")"
+# A code span is matched too, so tags are only stripped outside of it
+HTML_TAG = re.compile(rf"(`+).+?\1|</?{_TAG_NAME}\b[^>]*>", re.IGNORECASE)
+# A tag whose attributes continue on the next line
+OPEN_TAG = re.compile(rf"<{_TAG_NAME}\b[^>]*$", re.IGNORECASE)
+CODE_SPAN = re.compile(r"(`+).+?\1")
+HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+SPACES = re.compile(r"[ \t]{2,}")
+
+# Lines joined at most while looking for the end of a split tag
+MAX_TAG_LINES = 10
+
+
+def compact_readme(markdown: str, limit: int = MAX_README_CHARS) -> str:
+    """
+    Compact a README, keeping headings, prose and feature lists.
+
+    Badges, images, HTML, link URLs, license/contributor sections and long
+    code blocks are removed or cut to short excerpts. Stops as soon as `limit`
+    characters have been produced.
+
+    Args:
+        markdown: README content
+        limit: Maximum length of the result
+
+    Returns:
+        The compacted README, at most `limit` characters long
+    """
+    # Comments can span lines, so they go before the line-by-line pass
+    markdown = HTML_COMMENT.sub("", markdown)
+
+    parts = []
+    size = 0
+    for line in _compact_lines(_join_split_tags(markdown.splitlines())):
+        parts.append(line)
+        size += len(line) + 1
+        if size >= limit:
+            break
+    return "\n".join(parts)[:limit].strip()
+
+
+def _join_split_tags(lines: Iterable[str]) -> Iterator[str]:
+    """Join HTML tags that continue onto following lines, outside code blocks."""
+    fence = None
+    pending: list[str] = []
+
+    for line in lines:
+        if pending:
+            pending.append(line.strip())
+            if ">" in line or len(pending) >= MAX_TAG_LINES:
+                yield " ".join(pending)
+                pending = []
+            continue
+
+        fence_match = FENCE.match(line)
+        if fence is not None:
+            if fence_match and fence_match.group(1).startswith(fence):
+                fence = None
+        elif fence_match:
+            fence = fence_match.group(1)
+        elif OPEN_TAG.search(CODE_SPAN.sub("", line)):
+            pending = [line.rstrip()]
+            continue
+        yield line
+
+    if pending:
+        yield " ".join(pending)
+
+
+def _compact_lines(lines: Iterable[str]) -> Iterator[str]:
+    fence = None           # closing marker of the code block we are in
+    code_lines = 0
+    skip_level = None      # heading level of the section being skipped
+    table_rows = 0
+    blank = True
+
+    for line in lines:
+        fence_match = FENCE.match(line)
+
+        if fence is not None:
+            if fence_match and fence_match.group(1).startswith(fence):
+                fence = None
+                if skip_level is None:
+                    if code_lines > CODE_EXCERPT_LINES:
+                        yield "..."
+                    yield "```"
+                continue
+            code_lines += 1
+            if skip_level is None and code_lines <= CODE_EXCERPT_LINES:
+                yield line.rstrip()
+            continue
+
+        heading = HEADING.match(line)
+        if heading:
+            level = len(heading.group(1))
+            title = _clean_inline(heading.group(2))
+            if skip_level is not None and level > skip_level:
+                continue
+            skip_level = level if SKIPPED_SECTIONS.match(title) else None
+            if skip_level is None and title:
+                if not blank:
+                    yield ""
+                yield f"{heading.group(1)} {title}"
+                blank = False
+            continue
+
+        if skip_level is not None:
+            if fence_match:
+                fence, code_lines = fence_match.group(1), 0
+            continue
+
+        if fence_match:
+            fence, code_lines = fence_match.group(1), 0
+            yield f"```{fence_match.group(2)}"
+            blank = False
+            continue
+
+        if LINK_DEFINITION.match(line):
+            continue
+
+        if line.lstrip().startswith("|"):
+            if TABLE_SEPARATOR.match(line):
+                continue
+            table_rows += 1
+            if table_rows == TABLE_ROWS + 2:
+                yield "| ... |"
+            if table_rows > TABLE_ROWS + 1:
+                continue
+            cells = line.strip().strip("|").split("|")
+            line = "| " + " | ".join(_clean_inline(cell).strip() for cell in cells) + " |"
+        else:
+            table_rows = 0
+            line = _clean_inline(line)
+
+        if not line.strip(" -*_=|>#"):
+            # Blank, or only list/quote/table punctuation left after cleaning
+            if not blank:
+                yield ""
+                blank = True
+            continue
+
+        yield line
+        blank = False
+
+
+def _clean_inline(text: str) -> str:
+    text = BADGE.sub("", text)
+    text = IMAGE.sub("", text)
+    text = LINK.sub(r"\1", text)
+    text = HTML_TAG.sub(lambda match: match.group(0) if match.group(1) else "", text)
+    text = text.replace("&nbsp;", " ")
+    indent = len(text) - len(text.lstrip())
+    return text[:indent] + SPACES.sub(" ", text.strip())
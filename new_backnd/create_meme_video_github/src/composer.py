@@ -1,21 +1,38 @@
 """Compose the final video with background, audio, and captions using FFmpeg."""
 
+import io
 import json
 import random
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
+from typing import Callable, Iterable
 
+from .metrics import FFMPEG_FPS, FFMPEG_REALTIME_FACTOR, OUTPUT_BYTES
+from .tts import SAMPLE_RATE
 
-def get_background_video(backgrounds_dir: str | Path) -> Path:
-    """Get a random background video from the backgrounds directory."""
+# Keyframe interval for live (fragmented) output; each fragment spans one GOP
+LIVE_FRAGMENT_SECONDS = 2
+
+# Read size for FFmpeg's stdout when streaming
+PIPE_CHUNK_SIZE = 64 * 1024
+
+
+def get_background_video(backgrounds_dir: str | Path, seed: str | None = None) -> Path:
+    """
+    Get a random background video from the backgrounds directory.
+
+    Passing a seed makes the choice deterministic, so the same input always gets
+    the same background.
+    """
     backgrounds_dir = Path(backgrounds_dir)
 
     video_extensions = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
-    videos = [
+    videos = sorted(
         f for f in backgrounds_dir.iterdir()
         if f.suffix.lower() in video_extensions
-    ]
+    )
 
     if not videos:
         raise FileNotFoundError(
@@ -23,6 +40,8 @@ def get_background_video(backgrounds_dir: str | Path) -> Path:
             "Please add some background videos (Subway Surfers, Minecraft parkour, etc.)"
         )
 
+    if seed is not None:
+        return random.Random(seed).choice(videos)
     return random.choice(videos)
 
 
@@ -117,34 +136,49 @@ def format_ass_time(seconds: float) -> str:
 
 def compose_video(
     background_path: str | Path,
-    audio_path: str | Path,
+    audio_path: str | Path | None,
     words: list[dict],
     output_path: str | Path,
     target_resolution: tuple[int, int] = (720, 1280),  # Vertical video (720p)
     subtitle_style: str = "brainrot",
+    on_fragment: Callable[[bytes], None] | None = None,
+    on_progress: Callable[[dict], None] | None = None,
+    audio_pcm: bytes | None = None,
 ) -> Path:
     """
     Compose the final brainrot video using FFmpeg.
 
     Args:
         background_path: Path to background video
-        audio_path: Path to narration audio
+        audio_path: Path to narration audio; ignored when audio_pcm is given
         words: Word timestamps from caption generation
         output_path: Where to save the final video
         target_resolution: Output resolution (width, height)
+        subtitle_style: 'brainrot' or 'standard'
+        on_fragment: If given, encode fragmented MP4 through a pipe and call this
+            with each chunk as soon as it has been written to output_path
+        on_progress: Called with each parsed FFmpeg progress report
+            (see parse_ffmpeg_progress)
+        audio_pcm: Narration as 16-bit mono PCM at tts.SAMPLE_RATE. It is
+            piped into FFmpeg's stdin, so the audio is neither probed nor
+            read back from disk.
 
     Returns:
         Path to the output video
     """
     background_path = Path(background_path)
-    audio_path = Path(audio_path)
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     width, height = target_resolution
 
     # Get audio duration
-    audio_duration = get_audio_duration(audio_path)
+    if audio_pcm is not None:
+        audio_duration = len(audio_pcm) / (2 * SAMPLE_RATE)
+        audio_input = ["-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0"]
+    else:
+        audio_duration = get_audio_duration(audio_path)
+        audio_input = ["-i", str(audio_path)]
 
     # Create temp subtitle file
     with tempfile.NamedTemporaryFile(mode='w', suffix='.ass', delete=False) as f:
@@ -185,8 +219,10 @@ def compose_video(
 
     cmd = [
         "ffmpeg", "-y",
+        # Machine-readable progress on stderr instead of the human status line
+        "-nostats", "-loglevel", "error", "-progress", "pipe:2",
         "-i", str(background_path),
-        "-i", str(audio_path),
+        *audio_input,
         "-filter_complex", filter_complex,
         "-map", "[v]",
         "-map", "1:a",
@@ -196,38 +232,207 @@ def compose_video(
         "-c:a", "aac",
         "-b:a", "192k",
         "-shortest",
-        str(output_path),
     ]
 
+    def report(progress: dict) -> None:
+        _print_progress(progress)
+        if progress["done"]:
+            # The final report carries averages over the whole encode
+            FFMPEG_FPS.observe(progress["fps"])
+            FFMPEG_REALTIME_FACTOR.observe(progress["speed"])
+        if on_progress:
+            on_progress(progress)
+
     print(f"  Running FFmpeg...")
-    # Use Popen to stream progress to stdout so user doesn't think it's stuck
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1,
-        universal_newlines=True
+    if on_fragment is None:
+        cmd.append(str(output_path))
+        _run_ffmpeg(cmd, audio_duration, report, stdin_data=audio_pcm)
+    else:
+        # Fragmented MP4 needs no seekable output, so it can go through a pipe.
+        # A keyframe every 2 seconds bounds how long each fragment takes.
+        cmd += [
+            "-force_key_frames", f"expr:gte(t,n_forced*{LIVE_FRAGMENT_SECONDS})",
+            "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+            "-f", "mp4",
+            "pipe:1",
+        ]
+        _run_ffmpeg_to_pipe(cmd, output_path, on_fragment, audio_duration, report, stdin_data=audio_pcm)
+
+    OUTPUT_BYTES.observe(output_path.stat().st_size)
+
+    # Clean up temp subtitle file
+    subtitle_path.unlink()
+
+    return output_path
+
+
+def parse_ffmpeg_progress(lines: Iterable[str], duration: float, on_progress: Callable[[dict], None]) -> list[str]:
+    """
+    Parse the key=value blocks written by FFmpeg's -progress option.
+
+    Each block ends with a progress=continue|end line, at which point
+    on_progress is called with:
+        frame, fps, speed (realtime factor), out_time (seconds encoded),
+        percent (of duration), eta (estimated seconds left) and done.
+
+    Returns:
+        Any other lines FFmpeg wrote (errors, since it runs at -loglevel error)
+    """
+    block: dict[str, str] = {}
+    other_lines = []
+    for line in lines:
+        line = line.strip()
+        key, sep, value = line.partition("=")
+        if not sep or " " in key:
+            if line:
+                other_lines.append(line)
+            continue
+
+        block[key] = value.strip()
+        if key != "progress":
+            continue
+
+        out_time = _to_float(block.get("out_time_us")) / 1_000_000
+        speed = _to_float(block.get("speed", "").rstrip("x"))
+        remaining = max(duration - out_time, 0.0)
+        on_progress({
+            "frame": int(_to_float(block.get("frame"))),
+            "fps": _to_float(block.get("fps")),
+            "speed": speed,
+            "out_time": round(out_time, 3),
+            "percent": round(min(out_time / duration * 100, 100.0), 1) if duration > 0 else None,
+            "eta": round(remaining / speed, 1) if speed > 0 else None,
+            "done": value == "end",
+        })
+        block = {}
+    return other_lines
+
+
+def _to_float(value: str | None) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # FFmpeg reports N/A before the first frame is encoded
+        return 0.0
+
+
+def _print_progress(progress: dict) -> None:
+    """Echo FFmpeg progress so the user doesn't think it's stuck."""
+    percent = progress["percent"] if progress["percent"] is not None else 0.0
+    print(
+        f"\r  FFmpeg Progress: {percent:5.1f}% "
+        f"(frame={progress['frame']} fps={progress['fps']:.1f} speed={progress['speed']:.2f}x)",
+        end="",
+        flush=True,
     )
 
-    if process.stdout:
-        for line in process.stdout:
-            # Only print lines that look like progress to avoid cluttering
-            if "frame=" in line or "time=" in line or "fps=" in line:
-                print(f"\r  FFmpeg Progress: {line.strip()}", end="", flush=True)
-            elif "Error" in line:
-                print(f"\n  FFmpeg: {line.strip()}")
 
-    process.wait()
+def _check_ffmpeg(process: subprocess.Popen, errors: list[str]) -> None:
     print("\n  FFmpeg process finished.")
+    for line in errors:
+        print(f"  FFmpeg: {line}")
 
     if process.returncode != 0:
         raise RuntimeError(f"FFmpeg failed with return code {process.returncode}")
 
-    # Clean up temp subtitle file
-    subtitle_path.unlink()
 
-    return output_path
+def _feed_stdin(process: subprocess.Popen, data: bytes | None) -> threading.Thread | None:
+    """
+    Write data to FFmpeg's stdin on a thread, then close it.
+
+    FFmpeg only reads its input as fast as it encodes, so writing from the
+    thread that drains its output could fill both pipes and deadlock.
+    """
+    if data is None:
+        return None
+
+    def feed() -> None:
+        try:
+            process.stdin.write(data)
+        except OSError:
+            # FFmpeg stopped reading (usually it failed); its exit code says why
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=feed, daemon=True)
+    thread.start()
+    return thread
+
+
+def _run_ffmpeg(
+    cmd: list[str],
+    duration: float,
+    on_progress: Callable[[dict], None],
+    stdin_data: bytes | None = None,
+) -> None:
+    """Run FFmpeg writing to a file, reporting its progress as it goes."""
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    feeder = _feed_stdin(process, stdin_data)
+
+    errors = parse_ffmpeg_progress(
+        io.TextIOWrapper(process.stderr, errors="replace"), duration, on_progress,
+    )
+    process.wait()
+    if feeder is not None:
+        feeder.join()
+    _check_ffmpeg(process, errors)
+
+
+def _run_ffmpeg_to_pipe(
+    cmd: list[str],
+    output_path: Path,
+    on_fragment: Callable[[bytes], None],
+    duration: float,
+    on_progress: Callable[[dict], None],
+    stdin_data: bytes | None = None,
+) -> None:
+    """
+    Run FFmpeg writing to stdout, saving the output and forwarding it as it arrives.
+
+    Each chunk is written to output_path before on_fragment is called, so a
+    reader that follows on_fragment can also tail the file.
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    feeder = _feed_stdin(process, stdin_data)
+
+    # Progress arrives on stderr; drain it on a thread so neither pipe fills up
+    errors: list[str] = []
+    progress = threading.Thread(
+        target=lambda: errors.extend(parse_ffmpeg_progress(
+            io.TextIOWrapper(process.stderr, errors="replace"), duration, on_progress,
+        )),
+        daemon=True,
+    )
+    progress.start()
+
+    try:
+        with open(output_path, "wb") as f:
+            while chunk := process.stdout.read1(PIPE_CHUNK_SIZE):
+                f.write(chunk)
+                f.flush()
+                on_fragment(chunk)
+    finally:
+        process.stdout.close()
+        process.wait()
+        progress.join()
+        if feeder is not None:
+            feeder.join()
+
+    _check_ffmpeg(process, errors)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+"""Per-job event history with live fan-out to Server-Sent Events subscribers."""
+
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator
+
+# How many events a job keeps for subscribers that connect late
+MAX_EVENTS = 1000
+
+# Seconds between keep-alive comments on an idle SSE stream
+KEEPALIVE_SECONDS = 15
+
+
+class JobEvents:
+    """
+    Ordered events for one job.
+
+    publish() may be called from any thread, e.g. from FFmpeg progress parsing
+    on a render thread. Subscribers first receive the history, then new events
+    until the job closes the stream.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._history: deque[tuple[str, dict]] = deque(maxlen=MAX_EVENTS)
+        self._subscribers: set[asyncio.Queue] = set()
+        self._closed = False
+
+    def publish(self, event: str, data: dict) -> None:
+        """Record an event and deliver it to current subscribers. Thread-safe."""
+        self._loop.call_soon_threadsafe(self._publish, event, data)
+
+    def close(self) -> None:
+        """End every subscriber's stream once pending events are delivered. Thread-safe."""
+        self._loop.call_soon_threadsafe(self._close)
+
+    async def subscribe(self) -> AsyncIterator[tuple[str, dict] | None]:
+        """
+        Yield (event, data) pairs, or None after KEEPALIVE_SECONDS of silence.
+
+        Ends when the job has finished and all its events have been yielded.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in self._history:
+            queue.put_nowait(item)
+        if self._closed:
+            queue.put_nowait(None)
+        else:
+            self._subscribers.add(queue)
+
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if item is None:
+                    return
+                yield item
+        finally:
+            self._subscribers.discard(queue)
+
+    def _publish(self, event: str, data: dict) -> None:
+        if self._closed:
+            return
+        self._history.append((event, data))
+        for queue in self._subscribers:
+            queue.put_nowait((event, data))
+
+    def _close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+        self._subscribers.clear()
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
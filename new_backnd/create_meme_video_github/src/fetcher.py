@@ -1,12 +1,39 @@
-"""Fetch README.md from GitHub repositories."""
+"""Fetch READMEs from GitHub repositories."""
 
+import hashlib
+import json
+import logging
 import re
 import os
-import requests
-from dotenv import load_dotenv
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-load_dotenv()
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+from .clients import github_session
+from .metrics import README_CACHE, UPSTREAM_ERRORS, UPSTREAM_SECONDS
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API = "https://api.github.com"
+RAW_GITHUB = "https://raw.githubusercontent.com"
+
+# README names probed when the API is unavailable. HEAD is the default branch,
+# so repos on develop or trunk are found too.
+README_NAMES = ("README.md", "readme.md", "Readme.md", "README.MD", "README", "README.rst", "README.txt")
+
+# Seconds to wait for GitHub to respond
+REQUEST_TIMEOUT = 10
+
+# Where README bodies and their validators are kept between requests
+README_CACHE_DIR = Path(__file__).parent.parent / "output" / "readmes"
+
+# How long a repo confirmed to have no README is not asked about again
+README_NEGATIVE_TTL_SECONDS = int(os.getenv("README_NEGATIVE_TTL_SECONDS", "600"))
 
 
 def parse_github_url(url: str) -> tuple[str, str]:
@@ -34,12 +61,73 @@ def parse_github_url(url: str) -> tuple[str, str]:
     raise ValueError(f"Invalid GitHub URL or repo format: {url}")
 
 
-def fetch_readme(repo_url: str) -> str:
+class ReadmeCache:
+    """
+    README bodies with their ETag and Last-Modified, plus recent 404s.
+
+    Each repo is one small JSON file, replaced atomically, so concurrent
+    fetches from several threads or workers never see a partial entry.
+    """
+
+    def __init__(self, root: str | Path, negative_ttl: float = README_NEGATIVE_TTL_SECONDS):
+        self.root = Path(root)
+        self.negative_ttl = negative_ttl
+
+    def _path(self, owner: str, repo: str) -> Path:
+        name = hashlib.sha256(f"{owner}/{repo}".lower().encode("utf-8")).hexdigest()
+        return self.root / f"{name}.json"
+
+    def get(self, owner: str, repo: str) -> dict | None:
+        try:
+            return json.loads(self._path(owner, repo).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_missing(self, entry: dict | None) -> bool:
+        """Whether the entry is a 404 recent enough to trust without asking again."""
+        return bool(entry and entry.get("missing") and time.time() - entry["checked_at"] < self.negative_ttl)
+
+    def put_readme(self, owner: str, repo: str, body: str, etag: str | None, last_modified: str | None) -> None:
+        self._put(owner, repo, {
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "checked_at": time.time(),
+        })
+
+    def put_missing(self, owner: str, repo: str) -> None:
+        self._put(owner, repo, {"missing": True, "checked_at": time.time()})
+
+    def _put(self, owner: str, repo: str, entry: dict) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=self.root, suffix=".partial")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(partial, self._path(owner, repo))
+
+
+readme_cache = ReadmeCache(README_CACHE_DIR)
+
+
+def fetch_readme(repo_url: str, cache: ReadmeCache | None = readme_cache) -> str:
     """
-    Fetch the README.md content from a GitHub repository.
+    Fetch the README content from a GitHub repository.
+
+    One call to the GitHub API returns the README of the default branch,
+    whatever its name. If the API is unavailable (e.g. rate limited), all
+    likely README names are requested at once from raw.githubusercontent.com
+    and the first one found wins, so the lookup costs a single round trip
+    either way.
+
+    With a cache, a README fetched before is revalidated with If-None-Match /
+    If-Modified-Since: an unchanged README costs a 304, which does not count
+    against the GitHub rate limit. Repos the API reported as missing are
+    refused without a request for README_NEGATIVE_TTL_SECONDS, and a cached
+    README is served if GitHub cannot be reached.
 
     Args:
         repo_url: GitHub URL or owner/repo string
+        cache: README cache, or None to always download
 
     Returns:
         The raw markdown content of the README
@@ -48,36 +136,134 @@ def fetch_readme(repo_url: str) -> str:
         ValueError: If the URL format is invalid
         requests.HTTPError: If the request fails
     """
-    owner, repo = parse_github_url(repo_url)
+    import requests
 
-    # Try common README filenames
-    readme_names = ["README.md", "readme.md", "Readme.md", "README.MD", "README"]
+    owner, repo = parse_github_url(repo_url)
 
     headers = {}
-    if GITHUB_TOKEN:
-        headers["Authorization"] = f"token {GITHUB_TOKEN}"
+    github_token = os.getenv("GITHUB_TOKEN")
+    if github_token:
+        headers["Authorization"] = f"token {github_token}"
+
+    def not_found() -> requests.HTTPError:
+        UPSTREAM_ERRORS.inc(service="github", status="404")
+        return requests.HTTPError(
+            f"Could not find README for {owner}/{repo}. "
+            "Make sure the repository exists and is public."
+        )
+
+    entry = cache.get(owner, repo) if cache is not None else None
+    if cache is not None and cache.is_missing(entry):
+        README_CACHE.inc(result="negative_hit")
+        raise not_found()
+    cached_body = entry.get("body") if entry else None
+
+    api_headers = {**headers, "Accept": "application/vnd.github.raw"}
+    if cached_body is not None:
+        if entry.get("etag"):
+            api_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            api_headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = _get(f"{GITHUB_API}/repos/{owner}/{repo}/readme", "readme_api", api_headers)
+    except requests.RequestException as e:
+        logger.warning(f"Fetcher: GitHub API request failed ({e}), probing raw URLs")
+        response = None
+
+    if response is not None and response.status_code == 304 and cached_body is not None:
+        README_CACHE.inc(result="revalidated")
+        return cached_body
+
+    if response is not None and response.status_code == 200:
+        README_CACHE.inc(result="fetched")
+        if cache is not None:
+            cache.put_readme(
+                owner, repo, response.text,
+                response.headers.get("ETag"), response.headers.get("Last-Modified"),
+            )
+        return response.text
+
+    # The API answers 404 for missing and private repos and for repos without a README
+    if response is not None and response.status_code == 404:
+        if cache is not None:
+            cache.put_missing(owner, repo)
+        raise not_found()
 
-    for name in readme_names:
-        url = f"https://raw.githubusercontent.com/{owner}/{repo}/main/{name}"
-        response = requests.get(url, timeout=10, headers=headers)
+    if response is not None:
+        logger.warning(f"Fetcher: GitHub API returned {response.status_code}, probing raw URLs")
+    readme = _probe_raw(owner, repo, headers)
+    if readme is not None:
+        README_CACHE.inc(result="fetched")
+        if cache is not None:
+            # Raw validators are not comparable with the API's, so store none
+            cache.put_readme(owner, repo, readme, None, None)
+        return readme
 
-        if response.status_code == 200:
-            return response.text
+    if cached_body is not None:
+        logger.warning(f"Fetcher: GitHub unavailable, serving cached README for {owner}/{repo}")
+        README_CACHE.inc(result="stale")
+        return cached_body
+    raise not_found()
 
-        # Try master branch if main doesn't exist
-        url = f"https://raw.githubusercontent.com/{owner}/{repo}/master/{name}"
-        response = requests.get(url, timeout=10, headers=headers)
 
-        if response.status_code == 200:
-            return response.text
+def _get(url: str, operation: str, headers: dict, stream: bool = False) -> "requests.Response":
+    """GET from GitHub on the shared session, recording latency and errors."""
+    started = time.perf_counter()
+    try:
+        response = github_session().get(url, timeout=REQUEST_TIMEOUT, headers=headers, stream=stream)
+    except Exception:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="github", operation=operation, outcome="error")
+        UPSTREAM_ERRORS.inc(service="github", status="error")
+        raise
 
-    raise requests.HTTPError(
-        f"Could not find README for {owner}/{repo}. "
-        "Make sure the repository exists and is public."
-    )
+    outcome = "ok" if response.status_code == 200 else str(response.status_code)
+    UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="github", operation=operation, outcome=outcome)
+    # A 404 on one candidate is expected; fetch_readme counts the final miss
+    if response.status_code not in (200, 304, 404):
+        UPSTREAM_ERRORS.inc(service="github", status=str(response.status_code))
+    return response
+
+
+def _probe_raw(owner: str, repo: str, headers: dict) -> str | None:
+    """
+    Request every candidate README on the default branch concurrently.
+
+    Returns:
+        The body of the first candidate found, or None if none exists
+    """
+    import requests
+
+    urls = [f"{RAW_GITHUB}/{owner}/{repo}/HEAD/{name}" for name in README_NAMES]
+    pool = ThreadPoolExecutor(len(urls), thread_name_prefix="readme-probe")
+    # Bodies are streamed, so losing probes never download theirs
+    futures = [pool.submit(_get, url, "readme_probe", headers, True) for url in urls]
+    try:
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except requests.RequestException:
+                continue
+            if response.status_code == 200:
+                return response.text
+        return None
+    finally:
+        # Drop probes that have not started and release the connections of
+        # the rest as soon as they answer
+        pool.shutdown(wait=False, cancel_futures=True)
+        for future in futures:
+            future.add_done_callback(_close_response)
+
+
+def _close_response(future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
 
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
     # Quick test
     readme = fetch_readme("anthropics/anthropic-sdk-python")
     print(readme[:500])
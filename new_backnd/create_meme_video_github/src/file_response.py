@@ -0,0 +1,166 @@
+"""Serve files with HTTP range requests, strong ETags and conditional GETs."""
+
+import hashlib
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from typing import BinaryIO, Iterator
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Range and conditional requests are only defined for these (RFC 9110)
+CONDITIONAL_METHODS = ("GET", "HEAD")
+
+
+@lru_cache(maxsize=1024)
+def _content_hash(path: str, size: int, mtime_ns: int) -> str:
+    """SHA-256 of a file, remembered for as long as its size and mtime are unchanged."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+
+    return False
+
+
+def _requested_range(request: Request, size: int, etag: str, last_modified: str) -> tuple[int, int] | None:
+    """
+    Parse a single-range Range header into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be sent: no Range header, several
+    ranges, or an If-Range validator that no longer matches.
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    header = request.headers.get("range")
+    if not header:
+        return None
+
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() not in (etag, last_modified):
+        return None
+
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def _iter_range(file: BinaryIO, start: int, length: int) -> Iterator[bytes]:
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+async def file_response(
+    request: Request,
+    path: str | os.PathLike,
+    media_type: str,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """
+    Build a response for a file that honors Range, If-Range, If-None-Match and
+    If-Modified-Since.
+
+    The ETag is the SHA-256 of the file content, so it only changes when the
+    bytes do. Seeks become 206 partial reads and replays become 304s. Other
+    methods (e.g. a POST that just rendered the file) always get the whole
+    file with a 200.
+    """
+    # Open first so every header describes the bytes actually sent
+    file = open(path, "rb")
+    if request.method not in CONDITIONAL_METHODS:
+        size = os.fstat(file.fileno()).st_size
+        return StreamingResponse(
+            _iter_range(file, 0, size),
+            media_type=media_type,
+            headers={**(headers or {}), "Content-Length": str(size)},
+        )
+
+    try:
+        stat = os.fstat(file.fileno())
+        content_hash = await run_in_threadpool(_content_hash, str(path), stat.st_size, stat.st_mtime_ns)
+    except BaseException:
+        file.close()
+        raise
+
+    etag = f'"{content_hash}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    response_headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        file.close()
+        return Response(status_code=304, headers=response_headers)
+
+    size = stat.st_size
+    try:
+        byte_range = _requested_range(request, size, etag, last_modified)
+    except ValueError:
+        file.close()
+        return Response(status_code=416, headers={**response_headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = end - start + 1 if size else 0
+    response_headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        _iter_range(file, start, length),
+        status_code=status_code,
+        media_type=media_type,
+        headers=response_headers,
+    )
@@ -0,0 +1,197 @@
+"""Hedged requests: start a backup attempt when the first one is slower than usual."""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, TypeVar
+
+from .metrics import SUMMARIZE_HEDGE_AFTER_SECONDS, SUMMARIZE_HEDGES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Hedge summarization at all. Off by default: every hedge is an extra Gemini call.
+SUMMARY_HEDGE = os.getenv("SUMMARY_HEDGE", "0").lower() in ("1", "true", "yes")
+
+# Start the backup after this many seconds. 0 derives it from recent attempts,
+# at SUMMARY_HEDGE_PERCENTILE of their latency.
+SUMMARY_HEDGE_AFTER_SECONDS = float(os.getenv("SUMMARY_HEDGE_AFTER_SECONDS", "0"))
+SUMMARY_HEDGE_PERCENTILE = float(os.getenv("SUMMARY_HEDGE_PERCENTILE", "95"))
+
+# Hedges allowed per first attempt, over time
+SUMMARY_HEDGE_MAX_RATE = float(os.getenv("SUMMARY_HEDGE_MAX_RATE", "0.1"))
+
+# Recent attempt latencies kept for the percentile, and how many are needed
+# before it is trusted
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+
+# Hedges that may be saved up while traffic is quiet
+HEDGE_BURST = 3.0
+
+
+class HedgeBudget:
+    """
+    Caps hedges at a fraction of first attempts.
+
+    Every first attempt adds `ratio` of a hedge to the budget (up to a small
+    burst) and every hedge spends one, so over time no more than `ratio`
+    hedges are sent per request however slow Gemini gets.
+    """
+
+    def __init__(self, ratio: float, burst: float = HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._balance = min(1.0, burst)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._balance = min(self.burst, self._balance + self.ratio)
+
+    def take(self) -> bool:
+        with self._lock:
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            return False
+
+
+class Hedger:
+    """
+    Runs attempts one after another, with a capped number of hedges.
+
+    If the running attempt has not finished within the hedge threshold, a
+    second one is started next to it and whichever first produces an
+    acceptable result wins. The loser is told to stop through the `cancelled`
+    event; an attempt blocked inside a call simply has its result ignored.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = SUMMARY_HEDGE,
+        after_seconds: float = SUMMARY_HEDGE_AFTER_SECONDS,
+        percentile: float = SUMMARY_HEDGE_PERCENTILE,
+        max_rate: float = SUMMARY_HEDGE_MAX_RATE,
+    ):
+        self.enabled = enabled
+        self.after_seconds = after_seconds
+        self.percentile = percentile
+        self.budget = HedgeBudget(max_rate)
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Add the latency of a finished attempt."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def threshold(self) -> float | None:
+        """Seconds after which to hedge, or None while there is too little data."""
+        if self.after_seconds > 0:
+            return self.after_seconds
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)
+        threshold = ordered[max(0, index)]
+        SUMMARIZE_HEDGE_AFTER_SECONDS.set(threshold)
+        return threshold
+
+    def run(
+        self,
+        attempt: Callable[[int, bool, threading.Event], T | None],
+        max_attempts: int,
+        on_error: Callable[[Exception], None],
+    ) -> T | None:
+        """
+        Run up to max_attempts attempts until one returns a result.
+
+        Args:
+            attempt: Called as attempt(number, hedge, cancelled) on a worker
+                thread. Returns the result, or None if it was not acceptable.
+                number counts retries; a hedge gets the number of the attempt
+                it backs up, so it can send the same request. hedge is True
+                when another attempt is running alongside it. cancelled is set
+                once the race is over.
+            max_attempts: Total attempts, hedges included
+            on_error: Called with each attempt's exception; re-raise to give up
+
+        Returns:
+            The first acceptable result, or None if every attempt failed
+        """
+        cancelled = threading.Event()
+        if not self.enabled:
+            for number in range(max_attempts):
+                try:
+                    result = attempt(number, False, cancelled)
+                except Exception as e:
+                    on_error(e)
+                    continue
+                if result is not None:
+                    return result
+            return None
+
+        pool = ThreadPoolExecutor(2, thread_name_prefix="hedge")
+        running: dict[Future, tuple[float, bool]] = {}
+        launched = 0
+        retries = -1
+        hedged = False
+
+        def launch(hedge: bool) -> None:
+            nonlocal launched, retries
+            if not hedge:
+                self.budget.deposit()
+                retries += 1
+            running[pool.submit(attempt, retries, hedge, cancelled)] = (time.perf_counter(), hedge)
+            launched += 1
+
+        try:
+            launch(hedge=False)
+            while running:
+                timeout = None
+                if not hedged and launched < max_attempts and (threshold := self.threshold()) is not None:
+                    oldest = min(started for started, _ in running.values())
+                    timeout = max(0.0, oldest + threshold - time.perf_counter())
+
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # One hedge per slow attempt
+                    hedged = True
+                    if self.budget.take():
+                        logger.info(f"Hedging: Attempt {retries + 1} still running after {threshold:.1f}s; starting a backup")
+                        SUMMARIZE_HEDGES.inc(outcome="sent")
+                        launch(hedge=True)
+                    else:
+                        SUMMARIZE_HEDGES.inc(outcome="denied")
+                    continue
+
+                for future in done:
+                    started, hedge = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        on_error(e)
+                        continue
+                    self.record(time.perf_counter() - started)
+                    if result is not None:
+                        if hedge:
+                            SUMMARIZE_HEDGES.inc(outcome="won")
+                        return result
+
+                if not running and launched < max_attempts:
+                    hedged = False
+                    launch(hedge=False)
+            return None
+        finally:
+            cancelled.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+summary_hedger = Hedger()
@@ -0,0 +1,469 @@
+"""Background render jobs driven through the stage scheduler."""
+
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .admission import AdmissionController
+from .cache import DiskCache
+from .events import JobEvents
+from .fetcher import parse_github_url
+from .live import LiveVideo
+from .metrics import JOBS
+from .pipeline import render_video
+from .scheduler import StageScheduler
+from .store import JobStore
+from .tts import VOICE_MAPPING
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are forgotten after this many seconds
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+
+# An unfinished job whose process has not heartbeated for this long is
+# resumed by another process sharing the job store
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Heartbeats go out several times per lease, so one slow write is not fatal
+HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 4
+
+
+class IdempotencyKeyConflict(Exception):
+    """An Idempotency-Key was reused with different request parameters."""
+
+
+def request_key(
+    github_url: str, voice: str, subtitle_style: str, fresh: bool = False
+) -> tuple[str, str, str, str, bool]:
+    """
+    Build the key that identifies identical generate requests.
+
+    GitHub owner/repo names are case-insensitive and legacy voice names map to
+    Gemini voices, so equivalent spellings coalesce onto the same job. Fresh
+    requests never share a job with cached ones.
+    """
+    owner, repo = parse_github_url(github_url)
+    voice_name = VOICE_MAPPING.get(voice.lower(), voice)
+    return owner.lower(), repo.lower(), voice_name, subtitle_style, fresh
+
+
+@dataclass
+class Job:
+    """A single video generation job."""
+
+    id: str
+    github_url: str
+    voice: str
+    subtitle_style: str
+    output_path: Path
+    key: tuple[str, str, str, str, bool] = field(repr=False)
+    fresh: bool = False
+    status: str = "queued"  # queued -> running -> completed | failed
+    stage: str | None = None
+    r2_url: str | None = None
+    cached: bool = False
+    live: LiveVideo | None = field(default=None, repr=False)
+    client_id: str | None = field(default=None, repr=False)
+    events: JobEvents | None = field(default=None, repr=False)
+    error: str | None = None
+    exception: BaseException | None = field(default=None, repr=False)
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> dict:
+        """Public representation returned by the jobs API."""
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "github_url": self.github_url,
+            "voice": self.voice,
+            "subtitle_style": self.subtitle_style,
+            "fresh": self.fresh,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "completed":
+            data["video_url"] = f"/jobs/{self.id}/video"
+            data["r2_url"] = self.r2_url
+            data["cached"] = self.cached
+        if self.status == "failed":
+            data["error"] = self.error
+        return data
+
+    def to_record(self) -> dict:
+        """Row persisted in the job store."""
+        return {
+            "id": self.id,
+            "github_url": self.github_url,
+            "voice": self.voice,
+            "subtitle_style": self.subtitle_style,
+            "fresh": int(self.fresh),
+            "output_path": str(self.output_path),
+            "status": self.status,
+            "stage": self.stage,
+            "r2_url": self.r2_url,
+            "cached": int(self.cached),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Queues jobs and runs their stages on the scheduler without blocking the event loop.
+
+    With a job store, every job is recorded in SQLite and works in a durable
+    directory under output_dir/work. Jobs that were queued or running when the
+    process died are resumed, reusing the script, narration and word timings
+    they had already checkpointed. The store may be shared by several worker
+    processes: each heartbeats the jobs it runs, and only jobs whose process
+    has stopped heartbeating for JOB_LEASE_SECONDS are resumed elsewhere.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        backgrounds_dir: Path,
+        scheduler: StageScheduler | None = None,
+        cache: DiskCache | None = None,
+        artifacts: DiskCache | None = None,
+        admission: AdmissionController | None = None,
+        store: JobStore | None = None,
+    ):
+        self.output_dir = output_dir
+        self.backgrounds_dir = backgrounds_dir
+        self.scheduler = scheduler or StageScheduler()
+        self.cache = cache
+        self.artifacts = artifacts
+        self.admission = admission
+        self.store = store
+        # Store writes run here, one at a time and in order, never on the event loop
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="job-store") if store is not None else None
+        self.work_dir = output_dir / "work"
+        # Identifies this process as the owner of its jobs in the store
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._jobs: dict[str, Job] = {}
+        self._inflight: dict[tuple, Job] = {}
+        self._idempotency: dict[str, Job] = {}
+        # Last completed job per cacheable request, to spot repeats that the
+        # result cache will serve before paying for a fetch to find out
+        self._served: dict[tuple, Job] = {}
+        self._started = False
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """
+        Start the stage executors and resume abandoned jobs from the store.
+
+        Must be called from the running event loop.
+        """
+        self.scheduler.start()
+        self._started = True
+        if self.store is not None:
+            self._spawn(self._maintain())
+
+    async def _maintain(self) -> None:
+        """
+        Load recent jobs and resume abandoned ones, then keep heartbeating this
+        process's jobs, adopting abandoned ones and pruning old records.
+        """
+        now = time.time()
+        try:
+            self._restore(await self._in_store(self.store.load, now - JOB_TTL_SECONDS))
+        except Exception as e:
+            logger.warning(f"Jobs: Could not load jobs from the job store: {e}")
+
+        while True:
+            try:
+                await self._in_store(self.store.heartbeat, self.owner, now)
+                # Also picks up jobs of a sibling process that died while this one runs
+                self._restore(await self._in_store(self.store.claim, self.owner, now - JOB_LEASE_SECONDS, now))
+                await self._in_store(self.store.delete_finished_before, now - JOB_TTL_SECONDS)
+            except Exception as e:
+                logger.warning(f"Jobs: Job store maintenance failed: {e}")
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            now = time.time()
+
+    async def _in_store(self, fn, *args):
+        """Run a job store call on the writer thread and await its result."""
+        return await asyncio.wrap_future(self._writer.submit(fn, *args))
+
+    def _restore(self, records: list[dict]) -> None:
+        resumed = 0
+        for record in records:
+            job = Job(
+                id=record["id"],
+                github_url=record["github_url"],
+                voice=record["voice"],
+                subtitle_style=record["subtitle_style"],
+                output_path=Path(record["output_path"]),
+                key=request_key(
+                    record["github_url"], record["voice"], record["subtitle_style"], bool(record["fresh"])
+                ),
+                fresh=bool(record["fresh"]),
+                status=record["status"],
+                stage=record["stage"],
+                r2_url=record["r2_url"],
+                cached=bool(record["cached"]),
+                error=record["error"],
+                created_at=record["created_at"],
+                started_at=record["started_at"],
+                finished_at=record["finished_at"],
+                events=JobEvents(),
+            )
+            self._jobs[job.id] = job
+            if job.finished:
+                job.events.close()
+                job.done.set()
+            elif job.key in self._inflight:
+                # Only one job per request key may run; fail the duplicate
+                job.status = "failed"
+                job.error = "Superseded by an identical job after restart"
+                job.finished_at = time.time()
+                self._save(job)
+                job.events.close()
+                job.done.set()
+            else:
+                job.status = "queued"
+                self._schedule(job)
+                resumed += 1
+        if resumed:
+            logger.info(f"Jobs: Resuming {resumed} unfinished job(s) from the job store")
+
+    def shutdown(self) -> None:
+        """Stop accepting work, hand unfinished jobs back to the store and tear down the executors."""
+        self._started = False
+        for task in self._tasks:
+            task.cancel()
+        if self.store is not None:
+            # After the pending writes, so the next process to start resumes
+            # them without waiting out the lease
+            self._writer.submit(self.store.release, self.owner)
+            self._writer.shutdown(wait=True)
+        self.scheduler.shutdown()
+
+    @property
+    def active_jobs(self) -> int:
+        """Number of jobs queued or running."""
+        return len(self._inflight)
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def submit(
+        self,
+        github_url: str,
+        voice: str,
+        subtitle_style: str,
+        idempotency_key: str | None = None,
+        live: bool = False,
+        client_id: str | None = None,
+        fresh: bool = False,
+    ) -> Job:
+        """
+        Queue a job and return it immediately.
+
+        Identical requests share one in-flight job instead of rendering the same
+        video twice, and a repeated idempotency key returns the job it first
+        created, whether or not that job has finished. A new job created with
+        live=True encodes fragmented MP4 that can be streamed while it renders,
+        and one created with fresh=True writes a new script instead of reusing a
+        cached one.
+
+        Only requests that would start a new job go through admission control;
+        attaching to an existing job costs nothing and is always allowed. A
+        repeat of a video that is still in the result cache skips the capacity
+        checks, since it renders nothing, and gets its client token back once
+        the cache hit is confirmed.
+
+        Raises:
+            ValueError: If the GitHub URL cannot be parsed
+            IdempotencyKeyConflict: If the key was used for a different request
+            AdmissionRejected: If the server is overloaded or the client is over its rate
+        """
+        if not self._started:
+            raise RuntimeError("JobManager has not been started")
+
+        self._prune()
+        key = request_key(github_url, voice, subtitle_style, fresh)
+
+        if idempotency_key:
+            job = self._idempotency.get(idempotency_key)
+            if job is not None:
+                if job.key != key:
+                    raise IdempotencyKeyConflict(
+                        "Idempotency-Key was already used with different request parameters"
+                    )
+                logger.info(f"Jobs: Idempotency-Key matched job {job.id}")
+                return job
+
+        job = self._inflight.get(key)
+        if job is not None:
+            logger.info(f"Jobs: Coalescing request onto in-flight job {job.id}")
+        else:
+            if self.admission is not None:
+                self.admission.admit(client_id, active_jobs=self.active_jobs, cached=self._likely_cached(key))
+            job = self._create(github_url, voice, subtitle_style, key, live, fresh, client_id)
+
+        if idempotency_key:
+            self._idempotency[idempotency_key] = job
+        return job
+
+    def _likely_cached(self, key: tuple) -> bool:
+        """Whether a new job for this key will most likely be a result cache hit."""
+        if self.cache is None or key[-1]:
+            return False
+        job = self._served.get(key)
+        return job is not None and job.output_path.exists()
+
+    def _create(
+        self,
+        github_url: str,
+        voice: str,
+        subtitle_style: str,
+        key: tuple,
+        live: bool,
+        fresh: bool,
+        client_id: str | None = None,
+    ) -> Job:
+        job_id = str(uuid.uuid4())[:8]
+        job = Job(
+            id=job_id,
+            github_url=github_url,
+            voice=voice,
+            subtitle_style=subtitle_style,
+            output_path=self.output_dir / f"{job_id}.mp4",
+            key=key,
+            fresh=fresh,
+            client_id=client_id,
+            events=JobEvents(),
+        )
+        if live:
+            job.live = LiveVideo(job.output_path)
+        self._jobs[job_id] = job
+        self._schedule(job)
+        return job
+
+    def _schedule(self, job: Job) -> None:
+        self._inflight[job.key] = job
+        self._save(job)
+        self._spawn(self._run(job))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _save(self, job: Job) -> None:
+        if self.store is not None:
+            # Snapshot now; the write itself happens on the writer thread
+            record = {**job.to_record(), "owner": self.owner, "heartbeat_at": time.time()}
+            self._writer.submit(self._write, record)
+
+    def _write(self, record: dict) -> None:
+        try:
+            self.store.save(record)
+        except Exception as e:
+            logger.warning(f"Jobs: Could not save job {record['id']}: {e}")
+
+    async def wait(self, job: Job) -> Job:
+        """Wait until the job has completed or failed."""
+        await job.done.wait()
+        return job
+
+    async def _run(self, job: Job) -> None:
+        workspace = self.work_dir / job.id if self.store is not None else None
+
+        def on_event(event: str, data: dict) -> None:
+            if event == "stage" and data["state"] == "started":
+                job.stage = data["stage"]
+                self._save(job)
+            if event == "stage" and data["state"] == "completed" and self.admission is not None:
+                self.admission.timings.record(data["stage"], data["seconds"])
+            job.events.publish(event, data)
+
+        try:
+            job.status = "running"
+            job.started_at = time.time()
+            self._save(job)
+            job.events.publish("status", job.to_dict())
+            result = await render_video(
+                self.scheduler,
+                github_url=job.github_url,
+                voice=job.voice,
+                output_path=job.output_path,
+                backgrounds_dir=self.backgrounds_dir,
+                subtitle_style=job.subtitle_style,
+                cache=self.cache,
+                artifacts=self.artifacts,
+                live=job.live,
+                on_event=on_event,
+                workspace=workspace,
+                fresh=job.fresh,
+            )
+            job.output_path = result.video_path
+            job.r2_url = result.r2_url
+            job.cached = result.cached
+            job.status = "completed"
+            # Fresh renders refill the same cache entry, so they count too
+            self._served[job.key[:-1] + (False,)] = job
+            if job.cached and self.admission is not None:
+                self.admission.refund(job.client_id)
+        except Exception as e:
+            logger.error(f"Jobs: {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            job.exception = e
+        finally:
+            # A cancelled job (server shutting down) is left unfinished in the
+            # store with its workspace, to be resumed on the next start
+            if job.finished:
+                job.finished_at = time.time()
+                JOBS.inc(status=job.status, cached=str(job.cached).lower())
+                self._save(job)
+                if workspace is not None:
+                    shutil.rmtree(workspace, ignore_errors=True)
+            if job.live is not None:
+                job.live.close(error=job.error)
+            job.events.publish("status", job.to_dict())
+            job.events.close()
+            self._inflight.pop(job.key, None)
+            job.done.set()
+
+    def _prune(self) -> None:
+        """
+        Forget finished jobs older than JOB_TTL_SECONDS.
+
+        Only the in-memory maps are pruned here; old rows are deleted from the
+        store by the maintenance task, off the event loop.
+        """
+        cutoff = time.time() - JOB_TTL_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        self._idempotency = {
+            idempotency_key: job for idempotency_key, job in self._idempotency.items()
+            if job.id in self._jobs
+        }
+        self._served = {key: job for key, job in self._served.items() if job.id in self._jobs}
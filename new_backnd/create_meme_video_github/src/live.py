@@ -0,0 +1,123 @@
+"""Read a video file while FFmpeg is still writing it."""
+
+import asyncio
+import threading
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Callable
+
+
+class LiveVideo:
+    """
+    A video file that can be streamed to clients while it grows.
+
+    The composer writes each fragment to disk and then calls append(). Readers
+    tail the file, so any number of clients can follow the same render, and
+    clients that join late start from the first byte.
+
+    Readers wait on the event loop rather than on a thread, so a viewer costs
+    no worker while it waits for the next fragment. append() and close() may
+    be called from any thread; the state they change lives on the loop. Must
+    be created on the event loop.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        # Set on the event loop once the compose stage starts
+        self.started = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        # Replaced on every change, so waiters only ever see it set once
+        self._changed = asyncio.Event()
+        # Held while the file is moved or opened, never while waiting
+        self._path_lock = threading.Lock()
+        self._written = 0
+        self._closed = False
+        self._error: str | None = None
+
+    def append(self, chunk: bytes) -> None:
+        """Record that a chunk has been written to the file."""
+        self._call_on_loop(self._grow, len(chunk))
+
+    def close(self, error: str | None = None) -> None:
+        """Mark the file as complete, or as abandoned if error is given."""
+        self._call_on_loop(self._finish, error)
+
+    def relocate(self, move: Callable[[], Path]) -> Path:
+        """
+        Move the finished file without racing readers that are opening it.
+
+        Only a reader that opens the file during the move waits for it;
+        readers that already have it open keep reading.
+
+        Args:
+            move: Moves the file and returns its new path
+
+        Returns:
+            The new path
+        """
+        with self._path_lock:
+            self.path = move()
+            return self.path
+
+    async def iter_chunks(self, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """Yield the file's bytes as they are written, until it is complete."""
+        await self._wait_for(lambda: self._written > 0)
+        if self._error:
+            raise RuntimeError(self._error)
+        if self._written == 0:
+            return
+
+        f = await asyncio.to_thread(self._open)
+        try:
+            offset = 0
+            while True:
+                await self._wait_for(lambda: offset < self._written)
+                if self._error:
+                    raise RuntimeError(self._error)
+                available = self._written - offset
+
+                if available <= 0:
+                    return
+
+                while available > 0:
+                    chunk = await asyncio.to_thread(f.read, min(chunk_size, available))
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    available -= len(chunk)
+                    yield chunk
+        finally:
+            f.close()
+
+    async def _wait_for(self, ready: Callable[[], bool]) -> None:
+        """Wait until ready() is true or the file is closed."""
+        while not ready() and not self._closed:
+            await self._changed.wait()
+
+    def _open(self) -> BinaryIO:
+        with self._path_lock:
+            return open(self.path, "rb")
+
+    def _call_on_loop(self, fn: Callable, *args) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _grow(self, size: int) -> None:
+        self._written += size
+        self._notify()
+
+    def _finish(self, error: str | None) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
@@ -0,0 +1,269 @@
+"""Prometheus metrics in the text exposition format, without extra dependencies."""
+
+import math
+import threading
+from typing import Callable, Iterable
+
+# Content type Prometheus expects from a /metrics endpoint
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket upper bounds (seconds) for stage and request latencies
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+class Registry:
+    """Holds metrics and renders them for a scrape."""
+
+    def __init__(self):
+        self._metrics: list["_Metric"] = []
+        self._collectors: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Call `collector` before each scrape, e.g. to refresh gauges from live state."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in list(self._collectors):
+            collector()
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            labels = _format_labels(zip(self.labelnames, key))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. requests served or errors seen."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, e.g. queue depth."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        registry: Registry = REGISTRY,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                bucket_labels = _format_labels(labels + [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {counts[-1]}")
+        return lines
+
+
+# ---------------------------------------------------------------------------
+#  Pipeline metrics
+# ---------------------------------------------------------------------------
+
+STAGE_SECONDS = Histogram(
+    "reporot_stage_seconds",
+    "Wall time of each pipeline stage.",
+    ("stage", "outcome"),
+)
+STAGE_CACHED = Counter(
+    "reporot_stage_cached_total",
+    "Pipeline stages skipped because their output was in the artifact cache.",
+    ("stage",),
+)
+UPSTREAM_SECONDS = Histogram(
+    "reporot_upstream_request_seconds",
+    "Latency of each upstream API call, including every retry.",
+    ("service", "operation", "outcome"),
+)
+UPSTREAM_ERRORS = Counter(
+    "reporot_upstream_errors_total",
+    "Upstream failures by service and status, e.g. Gemini 429/503 or GitHub 404.",
+    ("service", "status"),
+)
+README_CACHE = Counter(
+    "reporot_readme_cache_total",
+    "README lookups by result: fetched, revalidated (304), negative_hit or stale.",
+    ("result",),
+)
+SUMMARIZE_ATTEMPTS = Counter(
+    "reporot_summarize_attempts_total",
+    "Script generation attempts by result (accepted, too_short or error).",
+    ("result",),
+)
+SUMMARIZE_HEDGES = Counter(
+    "reporot_summarize_hedges_total",
+    "Hedged script requests: sent, won (the backup was used) or denied by the hedge budget.",
+    ("outcome",),
+)
+SUMMARIZE_HEDGE_AFTER_SECONDS = Gauge(
+    "reporot_summarize_hedge_after_seconds",
+    "Current latency after which a backup script request is sent.",
+)
+QUOTA_WAIT_SECONDS = Histogram(
+    "reporot_gemini_quota_wait_seconds",
+    "Time Gemini calls spent queued for their model's rate limit.",
+    ("model",),
+)
+QUOTA_BACKOFFS = Counter(
+    "reporot_gemini_backoffs_total",
+    "Throttled or overloaded Gemini responses that paused the model's queue.",
+    ("model", "status"),
+)
+QUOTA_REJECTIONS = Counter(
+    "reporot_gemini_quota_rejections_total",
+    "Gemini calls given up on after waiting the full queue timeout.",
+    ("model",),
+)
+FFMPEG_FPS = Histogram(
+    "reporot_ffmpeg_fps",
+    "Average frames per second of finished FFmpeg encodes.",
+    buckets=(5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240),
+)
+FFMPEG_REALTIME_FACTOR = Histogram(
+    "reporot_ffmpeg_realtime_factor",
+    "Seconds of video encoded per second of wall time.",
+    buckets=(0.25, 0.5, 0.75, 1, 1.5, 2, 3, 4, 6, 8, 12),
+)
+OUTPUT_BYTES = Histogram(
+    "reporot_output_bytes",
+    "Size of rendered videos.",
+    buckets=tuple(mb * 1024 * 1024 for mb in (1, 2, 5, 10, 20, 50, 100, 200)),
+)
+JOBS = Counter(
+    "reporot_jobs_total",
+    "Finished jobs by status (completed or failed) and whether the result was cached.",
+    ("status", "cached"),
+)
+ADMISSION_REJECTIONS = Counter(
+    "reporot_admission_rejections_total",
+    "Requests refused by admission control, by HTTP status.",
+    ("status",),
+)
+
+STAGE_QUEUE_DEPTH = Gauge(
+    "reporot_stage_queue_depth",
+    "Stage calls waiting for a free worker, by executor pool.",
+    ("pool",),
+)
+WORKERS_BUSY = Gauge("reporot_workers_busy", "Workers running a stage, by executor pool.", ("pool",))
+
+# Refreshed at scrape time by the server's collector
+ACTIVE_JOBS = Gauge("reporot_active_jobs", "Jobs queued or running.")
+WORKERS = Gauge("reporot_workers", "Size of each executor pool.", ("pool",))
+CACHE_HITS = Counter("reporot_cache_hits_total", "Cache hits since startup.", ("cache",))
+CACHE_MISSES = Counter("reporot_cache_misses_total", "Cache misses since startup.", ("cache",))
+CACHE_HIT_RATIO = Gauge("reporot_cache_hit_ratio", "Share of cache lookups that hit since startup.", ("cache",))
+CACHE_SIZE_BYTES = Gauge("reporot_cache_size_bytes", "Bytes stored in each cache.", ("cache",))
+
+
+def error_status(error: BaseException) -> str:
+    """Best-effort HTTP status of an upstream exception, for the `status` label."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return str(code)
+    message = str(error)
+    for status in ("429", "503", "500", "404", "403"):
+        if status in message:
+            return status
+    return "error"
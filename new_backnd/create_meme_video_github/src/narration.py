@@ -0,0 +1,135 @@
+"""Speak a script sentence by sentence while the summarizer is still writing it."""
+
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .tts import (
+    TTS_CHUNK_CHARS,
+    Narration,
+    group_sentences,
+    resolve_voice,
+    span_records,
+    split_sentences,
+    stitch,
+    submit_chunk,
+)
+
+if TYPE_CHECKING:
+    from google import genai
+
+logger = logging.getLogger(__name__)
+
+# Speak the script while it streams in instead of after it is complete
+STREAM_NARRATION = os.getenv("STREAM_NARRATION", "1").lower() not in ("0", "false", "no")
+
+
+class Narrator:
+    """
+    Turns a script into speech as it is streamed in.
+
+    The summarizer feeds text deltas with feed(). Complete sentences are
+    grouped into chunks (see tts.group_sentences, which narrate() uses too),
+    and each chunk goes to Gemini TTS on the shared TTS pool as soon as it is
+    ready, so most of the narration already exists when the script is
+    finished. finish() speaks whatever is left and crossfades
+    the chunks, in script order, into one narration.
+
+    If the summarizer throws a script away (too short, or the stream failed
+    and is retried), it calls reset(), which drops everything spoken so far.
+    """
+
+    def __init__(
+        self,
+        voice: str,
+        chunk_chars: int = TTS_CHUNK_CHARS,
+        client: "genai.Client | None" = None,
+    ):
+        self.voice_name = resolve_voice(voice)
+        self.chunk_chars = chunk_chars
+        self.client = client
+        self._lock = threading.Lock()
+        self._pending = ""
+        self._sentences: list[str] = []
+        self._texts: list[str] = []
+        self._chunks: list[Future[bytes]] = []
+
+    def feed(self, text: str) -> None:
+        """Add streamed script text, sending any chunk that is now complete."""
+        with self._lock:
+            sentences, self._pending = split_sentences(self._pending + text)
+            self._sentences.extend(sentences)
+            self._send_ready()
+
+    def reset(self) -> None:
+        """Forget the script so far; chunks already sent are cancelled or ignored."""
+        with self._lock:
+            for chunk in self._chunks:
+                chunk.cancel()
+            self._chunks = []
+            self._texts = []
+            self._sentences = []
+            self._pending = ""
+
+    def finish(
+        self,
+        output_path: str | Path | None = None,
+        spans_path: str | Path | None = None,
+    ) -> Narration:
+        """
+        Speak the rest of the script and join the chunks.
+
+        Args:
+            output_path: If given, where to save the narration as a WAV file
+            spans_path: If given, where to write the time span of each chunk
+                (see tts.span_records)
+
+        Returns:
+            The narration, kept in memory
+
+        Raises:
+            Exception: The first TTS error of any chunk
+        """
+        with self._lock:
+            if self._pending.strip():
+                self._sentences.append(self._pending.strip())
+                self._pending = ""
+            tail = self._send_ready()
+            if tail:
+                self._send(" ".join(tail))
+            chunks = list(self._chunks)
+            texts = list(self._texts)
+        if not chunks:
+            raise RuntimeError("No script to narrate")
+
+        logger.info(f"Narration: Waiting for {sum(not c.done() for c in chunks)} of {len(chunks)} chunks")
+        pcm, spans = stitch([chunk.result() for chunk in chunks])
+        narration = Narration(pcm, span_records(texts, spans))
+        if output_path is not None:
+            narration.save(output_path, spans_path)
+        self.close()
+        return narration
+
+    def close(self) -> None:
+        """Cancel chunks that have not started."""
+        self.reset()
+
+    def __enter__(self) -> "Narrator":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _send_ready(self) -> list[str]:
+        """Send the chunks completed so far; returns the sentences not yet in one."""
+        chunks, tail = group_sentences(self._sentences, self.chunk_chars)
+        for text in chunks[len(self._texts):]:
+            self._send(text)
+        return tail
+
+    def _send(self, text: str) -> None:
+        self._texts.append(text)
+        self._chunks.append(submit_chunk(text, self.voice_name, self.client))
@@ -0,0 +1,367 @@
+"""End-to-end video generation pipeline used by the API server."""
+
+import contextlib
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from .cache import DiskCache
+from .clients import gemini_client, github_session
+from .compactor import compact_readme
+from .fetcher import fetch_readme
+from .live import LiveVideo
+from .metrics import STAGE_CACHED, STAGE_SECONDS
+from .narration import STREAM_NARRATION, Narrator
+from .summarizer import PROMPT_VERSION, SUMMARY_MODEL, summarize_readme
+from .tts import TTS_MODEL, Narration, VOICE_MAPPING, narrate
+from .captions import generate_captions_from_script
+from .composer import compose_video, get_background_video
+from .r2_utils import uploader
+from .scheduler import StageScheduler
+
+# SDKs imported lazily by the stages, loaded ahead of time by warm_up()
+WARM_UP_MODULES = ("google.genai.types",)
+
+# Bump whenever a change to the pipeline would produce a different video for the
+# same inputs, so stale cached results are not served.
+PIPELINE_VERSION = "1"
+
+
+@dataclass
+class RenderResult:
+    """Outcome of a successful render."""
+
+    video_path: Path
+    r2_url: str | None
+    cached: bool = False
+
+
+def warm_up() -> None:
+    """
+    Import the upstream SDKs and create the shared clients ahead of the first job.
+
+    All of this also happens lazily on first use. Doing it once at start-up, off
+    the event loop, keeps the cost out of the first request.
+    """
+    for name in WARM_UP_MODULES:
+        importlib.import_module(name)
+    github_session()
+    gemini_client()
+    uploader.connect()
+
+
+def _digest(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    """Write a text file so that it either exists complete or not at all."""
+    partial = path.with_name(path.name + ".partial")
+    partial.write_text(text, encoding="utf-8")
+    os.replace(partial, path)
+
+
+def result_key(readme_hash: str, voice: str, subtitle_style: str, background_path: Path) -> str:
+    """
+    Content hash identifying a finished video.
+
+    The background is identified by name and size rather than by hashing the
+    whole file, which keeps the key cheap to compute. The prompt and model
+    versions are included because this key is checked before the script's:
+    changing SYSTEM_PROMPT or a model must not keep serving old videos.
+    """
+    voice_name = VOICE_MAPPING.get(voice.lower(), voice)
+    return _digest(
+        PIPELINE_VERSION,
+        PROMPT_VERSION,
+        SUMMARY_MODEL,
+        TTS_MODEL,
+        readme_hash,
+        voice_name,
+        subtitle_style,
+        background_path.name,
+        str(background_path.stat().st_size),
+    )
+
+
+def artifact_key(stage: str, *inputs: str) -> str:
+    """Content hash identifying one stage's output from the hashes of its inputs."""
+    return _digest(PIPELINE_VERSION, stage, *inputs)
+
+
+async def render_video(
+    scheduler: StageScheduler,
+    github_url: str,
+    voice: str,
+    output_path: Path,
+    backgrounds_dir: Path,
+    subtitle_style: str = "brainrot",
+    cache: DiskCache | None = None,
+    artifacts: DiskCache | None = None,
+    live: LiveVideo | None = None,
+    on_event: Callable[[str, dict], None] | None = None,
+    workspace: Path | None = None,
+    fresh: bool = False,
+) -> RenderResult:
+    """
+    Generate a brainrot video from a GitHub repo and upload it to R2.
+
+    Every stage runs on the scheduler's executor for that stage, so stages of
+    other jobs keep making progress while this one waits. When a result cache is
+    given, an unchanged README with the same options returns the stored video
+    without rendering, and new renders are moved into the cache. When an
+    artifact cache is given, each intermediate stage output is stored under a
+    key built from its inputs, so changing one option only recomputes the
+    stages that depend on it. Scripts are keyed by the compacted README, the
+    prompt version and the model, so a README edit that does not survive
+    compaction (a new badge, say) still reuses the stored script.
+
+    Args:
+        scheduler: Started stage scheduler
+        github_url: Validated GitHub URL
+        voice: TTS voice name
+        output_path: Where to render the video
+        backgrounds_dir: Directory containing background videos
+        subtitle_style: 'brainrot' or 'standard'
+        cache: Finished-video cache
+        artifacts: Intermediate stage output cache
+        live: If given, the video is encoded as fragmented MP4 and can be
+            streamed from here while FFmpeg is still running
+        on_event: Called with (event, data) for stage timings ("stage") and
+            FFmpeg progress ("progress"). Progress events arrive from the
+            render thread.
+        workspace: Durable directory for the script, narration and word
+            timings. Outputs already checkpointed there by an interrupted run
+            are reused instead of calling Gemini again. Defaults to a
+            temporary directory.
+        fresh: Ask Gemini for a new script even if one is cached. The new
+            script and everything rendered from it replace the cached ones.
+
+    Returns:
+        Where the video ended up and its R2 URL (None if R2 is not configured)
+    """
+    def emit(event: str, data: dict) -> None:
+        if on_event:
+            on_event(event, data)
+
+    def finish(name: str, state: str, started: float) -> None:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name, outcome=state)
+        emit("stage", {"stage": name, "state": state, "seconds": round(seconds, 3)})
+
+    def reuse(name: str, state: str) -> None:
+        if state == "cached":
+            STAGE_CACHED.inc(stage=name)
+        emit("stage", {"stage": name, "state": state})
+
+    async def stage(name: str, fn, *args, **kwargs):
+        emit("stage", {"stage": name, "state": "started"})
+        started = time.perf_counter()
+        try:
+            result = await scheduler.run(name, fn, *args, **kwargs)
+        except Exception:
+            finish(name, "failed", started)
+            raise
+        finish(name, "completed", started)
+        return result
+
+    async def offload(fn, *args, **kwargs):
+        # Disk and hashing work between stages; it would stall every other job
+        # if it ran on the event loop
+        return await scheduler.run("storage", fn, *args, **kwargs)
+
+    # 1. Fetch README
+    print(f"Fetching README from {github_url}...")
+    readme_content = await stage("fetch", fetch_readme, github_url)
+
+    # 2. Pick the background, seeded by the README so repeat requests match
+    print("Getting background video...")
+    readme_hash = _text_hash(readme_content)
+    background_path = await stage("background", get_background_video, backgrounds_dir, seed=readme_hash)
+
+    key = result_key(readme_hash, voice, subtitle_style, background_path)
+    if cache is not None and not fresh:
+        hit = await offload(cache.get, key)
+        if hit is not None:
+            print(f"Result cache hit for {github_url}")
+            return RenderResult(cache.path(key, ".mp4"), hit.get("r2_url"), cached=True)
+
+    script_path = output_path.with_suffix(".txt")
+
+    if workspace is not None:
+        workspace.mkdir(parents=True, exist_ok=True)
+        scratch = contextlib.nullcontext(str(workspace))
+    else:
+        scratch = tempfile.TemporaryDirectory()
+
+    with scratch as temp_dir, contextlib.ExitStack() as cleanup:
+        temp_path = Path(temp_dir)
+
+        # Stage outputs are named after their artifact key, so a checkpoint left
+        # in the workspace is only reused if its inputs are unchanged
+        def checkpoint(artifact: str, suffix: str) -> Path:
+            return temp_path / f"{artifact}{suffix}"
+
+        def recover(artifact: str, suffix: str, recall: bool) -> tuple[Path | None, str | None]:
+            path = checkpoint(artifact, suffix)
+            if path.exists():
+                return path, "resumed"
+            if not recall:
+                return None, None
+            incoming = temp_path / "incoming"
+            incoming.mkdir(exist_ok=True)
+            if artifacts is not None and (stored := artifacts.get_copy(artifact, incoming)):
+                # Companion files (e.g. the narration's chunk spans) first, so
+                # the main file only appears once everything is in place
+                for companion in stored.keys() - {suffix}:
+                    os.replace(stored[companion], checkpoint(artifact, companion))
+                os.replace(stored[suffix], path)
+                return path, "cached"
+            return None, None
+
+        async def restore(name: str, artifact: str, suffix: str, recall: bool = True) -> Path | None:
+            path, state = await offload(recover, artifact, suffix, recall)
+            if state == "resumed":
+                print(f"Resuming {name} from checkpoint...")
+            elif state == "cached":
+                print(f"Reusing cached {name} output...")
+            if state is not None:
+                reuse(name, state)
+            return path
+
+        async def remember(artifact: str, files: dict[str, Path]) -> None:
+            if artifacts is not None:
+                await offload(artifacts.put, artifact, files, copy=True)
+
+        # 3. Generate brainrot script (depends on the compacted README, the
+        # prompt and the model). A fresh job still resumes its own checkpoint.
+        compacted_hash = await offload(lambda: _text_hash(compact_readme(readme_content)))
+        script_key = artifact_key("script", compacted_hash, PROMPT_VERSION, SUMMARY_MODEL)
+        narrator = None
+        if script_file := await restore("summarize", script_key, ".txt", recall=not fresh):
+            script = script_file.read_text(encoding="utf-8")
+        else:
+            print("Generating brainrot script...")
+            if STREAM_NARRATION:
+                # Speech for the first sentences is synthesized while the rest
+                # of the script is still being written
+                narrator = cleanup.enter_context(Narrator(voice))
+            script = await stage("summarize", summarize_readme, readme_content, narrator=narrator)
+            script_file = checkpoint(script_key, ".txt")
+            _write_atomic(script_file, script)
+            await remember(script_key, {".txt": script_file})
+        script_hash = _text_hash(script)
+
+        # Save script to file for inspection
+        try:
+            print(f"Saving script to {script_path}...")
+            script_path.write_text(script, encoding="utf-8")
+        except Exception as e:
+            print(f"Warning: Could not save script file: {e}")
+
+        # 4. Generate TTS audio (depends on the script and voice)
+        voice_name = VOICE_MAPPING.get(voice.lower(), voice)
+        audio_key = artifact_key("audio", script_hash, voice_name, TTS_MODEL)
+        # The narration stays in memory from here on: captions and FFmpeg take
+        # its duration from the sample count and its PCM through a pipe. The
+        # WAV file is only written for the checkpoint and the artifact cache.
+        spans_file = checkpoint(audio_key, ".json")
+        if audio_path := await restore("tts", audio_key, ".wav"):
+            # No spans file for narration cached before speech was chunked
+            narration = await offload(Narration.load, audio_path, spans_file)
+        else:
+            print(f"Generating speech with {voice} voice...")
+            audio_path = checkpoint(audio_key, ".wav")
+            partial_path = temp_path / "narration.partial.wav"
+            spans_partial = temp_path / "narration.partial.json"
+            if narrator is not None:
+                narration = await stage("tts", narrator.finish, partial_path, spans_path=spans_partial)
+            else:
+                narration = await stage("tts", narrate, script, voice, output_path=partial_path, spans_path=spans_partial)
+            os.replace(spans_partial, spans_file)
+            os.replace(partial_path, audio_path)
+            await remember(audio_key, {".wav": audio_path, ".json": spans_file})
+
+        # 5. Generate captions (depends on the script and audio, and is timed
+        # by the narration's chunk spans)
+        pcm_hash = await offload(lambda: hashlib.sha256(narration.pcm).hexdigest())
+        words_key = artifact_key("words", script_hash, pcm_hash)
+        if words_file := await restore("captions", words_key, ".json"):
+            words = json.loads(words_file.read_text(encoding="utf-8"))
+        else:
+            print("Generating captions...")
+            words = await stage(
+                "captions",
+                generate_captions_from_script,
+                script,
+                audio_path,
+                spans=narration.spans,
+                duration=narration.duration,
+            )
+            words_file = checkpoint(words_key, ".json")
+            _write_atomic(words_file, json.dumps(words))
+            await remember(words_key, {".json": words_file})
+
+        # 6. Compose final video
+        print(f"Composing video to {output_path}...")
+        if live is not None:
+            live.started.set()
+        try:
+            await stage(
+                "compose",
+                compose_video,
+                background_path=background_path,
+                audio_path=None,
+                audio_pcm=narration.pcm,
+                words=words,
+                output_path=output_path,
+                subtitle_style=subtitle_style,
+                on_fragment=live.append if live is not None else None,
+                on_progress=lambda progress: emit("progress", progress),
+            )
+        except Exception as e:
+            if live is not None:
+                live.close(error=str(e))
+            raise
+        if live is not None:
+            live.close()
+
+    if not output_path.exists():
+        raise RuntimeError("Video generation failed - file not created")
+
+    video_path = output_path
+    if cache is not None:
+        files = {".mp4": output_path}
+        if script_path.exists():
+            files[".txt"] = script_path
+
+        def move_into_cache() -> Path:
+            cache.put(key, files)
+            return cache.path(key, ".mp4")
+
+        # Live readers may still be opening the rendered file
+        if live is not None:
+            video_path = await offload(live.relocate, move_into_cache)
+        else:
+            video_path = await offload(move_into_cache)
+
+    # 7. Upload to R2
+    r2_url = await stage("upload", uploader.upload_file, video_path)
+    if cache is not None:
+        await offload(cache.update_meta, key, r2_url=r2_url)
+
+    return RenderResult(video_path, r2_url)
@@ -0,0 +1,297 @@
+"""Rate limiting and backoff for Gemini calls, shared by every worker process on the node."""
+
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from .metrics import (
+    QUOTA_BACKOFFS,
+    QUOTA_REJECTIONS,
+    QUOTA_WAIT_SECONDS,
+    UPSTREAM_ERRORS,
+    UPSTREAM_SECONDS,
+    error_status,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Where the buckets live. Every process that opens this file shares them.
+QUOTA_DB_PATH = Path(__file__).parent.parent / "output" / "quota.db"
+
+# Requests per minute allowed for each model, and how many may go out back to back
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "30"))
+GEMINI_BURST = max(1, int(os.getenv("GEMINI_BURST", "5")))
+
+# Per-model overrides, e.g. "gemini-2.5-flash-preview-tts=10,gemini-2.0-flash-exp=15"
+GEMINI_MODEL_LIMITS = os.getenv("GEMINI_MODEL_LIMITS", "")
+
+# How long one call may wait in the queue, across all of its retries, before
+# it is rejected
+GEMINI_QUEUE_SECONDS = float(os.getenv("GEMINI_QUEUE_SECONDS", "120"))
+
+# Retries after a throttled or overloaded response
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+
+# Exponential backoff when the server gives no retry hint: base * 2^attempt, capped
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 32.0
+
+# Upstream statuses worth retrying
+RETRYABLE_STATUSES = {"429", "500", "503", "504"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    model TEXT PRIMARY KEY,
+    next_slot REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+DURATION = re.compile(r"^\s*([\d.]+)\s*s\s*$")
+
+
+class QuotaExhausted(RuntimeError):
+    """A Gemini call waited longer than the queue allows for its model's quota."""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Gemini quota for {model} is busy; try again in {retry_after:.0f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an upstream error means "slow down" rather than "this request is wrong"."""
+    return error_status(error) in RETRYABLE_STATUSES
+
+
+def retry_hint(error: BaseException) -> float | None:
+    """
+    Seconds the server asked us to wait, if it said.
+
+    Gemini puts a google.rpc.RetryInfo entry with a `retryDelay` such as "37s"
+    in the error details of a 429; plain HTTP responses may send Retry-After.
+    """
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for entry in (details.get("error") or details).get("details") or []:
+            if isinstance(entry, dict) and (match := DURATION.match(str(entry.get("retryDelay", "")))):
+                return float(match.group(1))
+
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, so retries from many workers spread out."""
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _parse_limits(spec: str) -> dict[str, float]:
+    limits = {}
+    for item in spec.split(","):
+        model, _, rate = item.partition("=")
+        if model.strip() and rate.strip():
+            limits[model.strip()] = float(rate)
+    return limits
+
+
+class QuotaGovernor:
+    """
+    One token bucket per Gemini model, kept in SQLite so that all worker
+    processes on the node draw from the same quota.
+
+    Each bucket is stored as the time of its next free slot (a token bucket
+    expressed as a schedule). A caller reserves the earliest slot in one short
+    transaction and sleeps until it comes round, so waiting callers form a
+    queue in arrival order instead of polling. A throttled response pushes the
+    bucket's `blocked_until` forward for everyone, so one 429 pauses the whole
+    node rather than setting off a retry from every worker.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+        burst: int = GEMINI_BURST,
+        limits: dict[str, float] | None = None,
+        queue_seconds: float = GEMINI_QUEUE_SECONDS,
+        max_retries: int = GEMINI_MAX_RETRIES,
+    ):
+        self.path = Path(path)
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.limits = limits if limits is not None else _parse_limits(GEMINI_MODEL_LIMITS)
+        self.queue_seconds = queue_seconds
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so importing the module touches no files
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def interval(self, model: str) -> float:
+        """Seconds between requests to model at its sustained rate."""
+        return 60.0 / self.limits.get(model, self.requests_per_minute)
+
+    def _update(self, model: str, change: Callable[[float, float, float], tuple[float, float, T]]) -> T:
+        """Read, change and write one bucket in a single write transaction."""
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = db.execute(
+                    "SELECT next_slot, blocked_until FROM buckets WHERE model = ?", (model,)
+                ).fetchone()
+                next_slot, blocked_until = row if row else (0.0, 0.0)
+                next_slot, blocked_until, result = change(now, next_slot, blocked_until)
+                db.execute(
+                    "INSERT OR REPLACE INTO buckets (model, next_slot, blocked_until) VALUES (?, ?, ?)",
+                    (model, next_slot, blocked_until),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return result
+
+    def reserve(self, model: str, max_wait: float) -> float:
+        """
+        Reserve the next request slot for model.
+
+        Returns:
+            Seconds to wait before sending the request
+
+        Raises:
+            QuotaExhausted: If the slot is more than max_wait seconds away. No
+                slot is taken in that case.
+        """
+        interval = self.interval(model)
+        # Up to `burst` requests may share the current slot window
+        tolerance = (self.burst - 1) * interval
+
+        def take(now: float, next_slot: float, blocked_until: float):
+            start = max(now, next_slot - tolerance, blocked_until)
+            wait = start - now
+            if wait > max_wait:
+                raise QuotaExhausted(model, retry_after=wait)
+            return max(next_slot, start) + interval, blocked_until, wait
+
+        return self._update(model, take)
+
+    def blocked_for(self, model: str) -> float:
+        """Seconds until the model's bucket is unblocked (0 if it is not blocked)."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT blocked_until FROM buckets WHERE model = ?", (model,)
+            ).fetchone()
+        return max(0.0, row[0] - time.time()) if row else 0.0
+
+    def penalize(self, model: str, delay: float) -> None:
+        """Hold every request to model, in every process, for delay seconds."""
+        tolerance = (self.burst - 1) * self.interval(model)
+
+        def block(now: float, next_slot: float, blocked_until: float):
+            until = max(blocked_until, now + delay)
+            # Requests after the pause go out one interval apart, not as a burst
+            return max(next_slot, until + tolerance), until, None
+
+        self._update(model, block)
+
+    def acquire(self, model: str, deadline: float) -> None:
+        """
+        Wait in the model's queue until a request may be sent.
+
+        Args:
+            model: Gemini model name
+            deadline: time.monotonic() value after which to give up
+
+        Raises:
+            QuotaExhausted: If no slot opens before the deadline
+        """
+        started = time.monotonic()
+        try:
+            wait = self.reserve(model, max_wait=deadline - time.monotonic())
+            if wait > 0:
+                time.sleep(wait)
+            # Another worker may have been throttled while we slept. The slot
+            # we hold is kept; reserving again would spend a second one.
+            while (blocked := self.blocked_for(model)) > 0:
+                if time.monotonic() + blocked > deadline:
+                    raise QuotaExhausted(model, retry_after=blocked)
+                time.sleep(blocked)
+        except QuotaExhausted:
+            QUOTA_REJECTIONS.inc(model=model)
+            raise
+        finally:
+            QUOTA_WAIT_SECONDS.observe(time.monotonic() - started, model=model)
+
+    def call(self, model: str, operation: str, fn: Callable[[], T]) -> T:
+        """
+        Call Gemini through the model's quota, retrying throttled or overloaded responses.
+
+        Retries wait for the server's retry hint when it gives one, otherwise
+        for an exponential backoff with jitter. Either way the wait is shared
+        with every other caller of the model.
+
+        Args:
+            model: Gemini model the call goes to
+            operation: Label for upstream metrics, e.g. "summarize"
+            fn: Makes the request
+
+        Returns:
+            Whatever fn returns
+
+        Raises:
+            QuotaExhausted: If the call could not get a slot within the queue timeout
+            Exception: The last upstream error, if it was not retryable or
+                retries ran out
+        """
+        deadline = time.monotonic() + self.queue_seconds
+        attempt = 0
+        while True:
+            self.acquire(model, deadline)
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="gemini", operation=operation, outcome="error")
+                status = error_status(e)
+                UPSTREAM_ERRORS.inc(service="gemini", status=status)
+                if status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    raise
+                hint = retry_hint(e)
+                delay = hint + random.uniform(0, BACKOFF_BASE_SECONDS) if hint is not None else backoff_delay(attempt)
+                if time.monotonic() + delay > deadline:
+                    # Waiting would not fit in the queue timeout (a daily quota, say)
+                    raise
+                logger.warning(f"Quota: {model} returned {status}; holding requests for {delay:.1f}s")
+                QUOTA_BACKOFFS.inc(model=model, status=status)
+                self.penalize(model, delay)
+                attempt += 1
+                continue
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="gemini", operation=operation, outcome="ok")
+            return result
+
+
+gemini_quota = QuotaGovernor(QUOTA_DB_PATH)
@@ -1,25 +1,29 @@
 import os
 import logging
+import threading
+import time
 from pathlib import Path
-import boto3
-from botocore.config import Config
-from dotenv import load_dotenv
 
-# Ensure env is reloaded at runtime with absolute path
-ENV_PATH = Path(__file__).parent.parent / ".env"
-load_dotenv(ENV_PATH, override=True)
+from .clients import HTTP_POOL_SIZE
+from .metrics import UPSTREAM_ERRORS, UPSTREAM_SECONDS, error_status
 
 logger = logging.getLogger(__name__)
 
 class R2Uploader:
     def __init__(self):
-        self._initialize_client()
+        # The boto3 client is created on first use (see connect) so importing
+        # this module stays cheap
+        self.s3_client = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Create the S3 client now instead of on the first upload."""
+        with self._lock:
+            if not self.s3_client:
+                self._initialize_client()
 
     def _initialize_client(self):
-        # Reload env locally in case of mid-session changes
-        logger.info(f"R2 Uploader: Loading environment from {ENV_PATH.absolute()}")
-        load_dotenv(ENV_PATH, override=True)
-        
+        # Settings come from the process environment (server.py loads .env once)
         self.account_id = os.getenv("CLOUDFLARE_ACCOUNT_ID")
         self.access_key_id = os.getenv("R2_ACCESS_KEY_ID")
         self.secret_access_key = os.getenv("R2_SECRET_ACCESS_KEY")
@@ -40,6 +44,9 @@ class R2Uploader:
             self.s3_client = None
         else:
             try:
+                import boto3
+                from botocore.config import Config
+
                 # Masked display for debugging
                 logger.info(f"R2 Uploader: Initializing with Account: {self.account_id[:4]}... Bucket: {self.bucket_name}")
                 self.s3_client = boto3.client(
@@ -47,7 +54,13 @@ class R2Uploader:
                     endpoint_url=f"https://{self.account_id}.r2.cloudflarestorage.com",
                     aws_access_key_id=self.access_key_id,
                     aws_secret_access_key=self.secret_access_key,
-                    config=Config(signature_version="s3v4", connect_timeout=5, retries={'max_attempts': 2}),
+                    config=Config(
+                        signature_version="s3v4",
+                        connect_timeout=5,
+                        retries={'max_attempts': 2},
+                        # One shared client for all jobs; keep enough connections for parallel uploads
+                        max_pool_connections=HTTP_POOL_SIZE,
+                    ),
                     region_name="auto"
                 )
                 logger.info("R2 Uploader: Client initialized successfully.")
@@ -56,13 +69,13 @@ class R2Uploader:
                 self.s3_client = None
 
     def upload_file(self, file_path: Path) -> str:
-        # Re-verify client if it wasn't initialized
-        if not self.s3_client:
-            self._initialize_client()
+        # Create the client on first use, or retry if it wasn't initialized
+        self.connect()
             
         if not self.s3_client:
             return None
             
+        started = time.perf_counter()
         try:
             object_name = file_path.name
             logger.info(f"R2: Uploading {object_name}...")
@@ -74,10 +87,14 @@ class R2Uploader:
                 ExtraArgs={'ContentType': 'video/mp4' if file_path.suffix == '.mp4' else 'text/plain'}
             )
             
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="r2", operation="upload", outcome="ok")
+
             url = f"https://{self.public_domain}/{object_name}" if self.public_domain else object_name
             logger.info(f"R2: Upload successful -> {url}")
             return url
         except Exception as e:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="r2", operation="upload", outcome="error")
+            UPSTREAM_ERRORS.inc(service="r2", status=error_status(e))
             logger.error(f"R2: Upload failed: {e}")
             return None
 
@@ -0,0 +1,85 @@
+"""Per-stage executors so network-bound and CPU-bound stages of different jobs overlap."""
+
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .metrics import STAGE_QUEUE_DEPTH, WORKERS_BUSY
+
+logger = logging.getLogger(__name__)
+
+# Stages that mostly wait on GitHub, Gemini or R2 share a wide thread pool
+NETWORK_WORKERS = max(1, int(os.getenv("NETWORK_WORKERS") or "32"))
+
+# Number of FFmpeg encodes that may run at once. Each slot drives one FFmpeg
+# process, so the default leaves every encode a couple of cores to work with.
+# An empty value also means the default.
+RENDER_WORKERS = max(1, int(os.getenv("RENDER_WORKERS") or max(1, (os.cpu_count() or 2) // 2)))
+
+NETWORK = "network"
+RENDER = "render"
+
+# Executor used by each pipeline stage
+STAGE_POOLS = {
+    "fetch": NETWORK,
+    "summarize": NETWORK,
+    "tts": NETWORK,
+    "captions": NETWORK,
+    "background": NETWORK,
+    "compose": RENDER,
+    "upload": NETWORK,
+    # Cache lookups, copies and hashing done between stages, kept off the event loop
+    "storage": NETWORK,
+}
+
+
+class StageScheduler:
+    """
+    Runs each pipeline stage on the executor that matches its workload.
+
+    While one job holds a render slot for its FFmpeg encode, the next jobs can
+    still fetch, summarize and synthesize speech on the network pool.
+    """
+
+    def __init__(self, network_workers: int = NETWORK_WORKERS, render_workers: int = RENDER_WORKERS):
+        self.network_workers = network_workers
+        self.render_workers = render_workers
+        self._pools: dict[str, ThreadPoolExecutor] = {}
+
+    def start(self) -> None:
+        logger.info(
+            f"Scheduler: Starting with {self.network_workers} network workers "
+            f"and {self.render_workers} render slots"
+        )
+        self._pools = {
+            NETWORK: ThreadPoolExecutor(self.network_workers, thread_name_prefix="stage-network"),
+            RENDER: ThreadPoolExecutor(self.render_workers, thread_name_prefix="stage-render"),
+        }
+
+    def shutdown(self) -> None:
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools = {}
+
+    async def run(self, stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking stage function on its executor and await the result."""
+        if not self._pools:
+            raise RuntimeError("StageScheduler has not been started")
+
+        pool_name = STAGE_POOLS[stage]
+        call = functools.partial(fn, *args, **kwargs)
+
+        def tracked():
+            STAGE_QUEUE_DEPTH.dec(pool=pool_name)
+            WORKERS_BUSY.inc(pool=pool_name)
+            try:
+                return call()
+            finally:
+                WORKERS_BUSY.dec(pool=pool_name)
+
+        loop = asyncio.get_running_loop()
+        STAGE_QUEUE_DEPTH.inc(pool=pool_name)
+        return await loop.run_in_executor(self._pools[pool_name], tracked)
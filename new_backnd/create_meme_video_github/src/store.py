@@ -0,0 +1,162 @@
+"""Durable job records in SQLite so jobs survive a restart."""
+
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "id",
+    "github_url",
+    "voice",
+    "subtitle_style",
+    "fresh",
+    "output_path",
+    "status",
+    "stage",
+    "r2_url",
+    "cached",
+    "error",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "owner",
+    "heartbeat_at",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    github_url TEXT NOT NULL,
+    voice TEXT NOT NULL,
+    subtitle_style TEXT NOT NULL,
+    fresh INTEGER NOT NULL DEFAULT 0,
+    output_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    r2_url TEXT,
+    cached INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+"""
+
+
+class JobStore:
+    """
+    Job records kept in a SQLite database.
+
+    Writes are small and happen a handful of times per job (on creation, on
+    each stage and when it finishes), so a single connection guarded by a lock
+    is plenty.
+
+    Several server processes may share one database. Each unfinished job is
+    owned by the process running it, which refreshes heartbeat_at while it
+    is alive; only jobs whose owner has stopped heartbeating are claimed by
+    another process.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        # WAL keeps each commit to one sequential append
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Add columns introduced after a database was created."""
+        existing = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "fresh" not in existing:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN fresh INTEGER NOT NULL DEFAULT 0")
+        if "owner" not in existing:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        if "heartbeat_at" not in existing:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    def save(self, record: dict) -> None:
+        """Insert or replace a job record. Keys must be COLUMNS."""
+        values = [record[column] for column in COLUMNS]
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                values,
+            )
+
+    def load(self, finished_since: float) -> list[dict]:
+        """
+        Finished records worth keeping in memory after a restart.
+
+        Returns:
+            Jobs that finished after finished_since, oldest first
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE finished_at >= ? ORDER BY created_at",
+                (finished_since,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim(self, owner: str, stale_before: float, now: float) -> list[dict]:
+        """
+        Take over unfinished jobs whose owner stopped heartbeating.
+
+        Rows are selected and updated in one write transaction, so two
+        processes starting together never claim the same job.
+
+        Returns:
+            The claimed records, oldest first
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE finished_at IS NULL"
+                    " AND (heartbeat_at IS NULL OR heartbeat_at < ?) ORDER BY created_at",
+                    (stale_before,),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE jobs SET owner = ?, heartbeat_at = ? WHERE id = ?",
+                    [(owner, now, row["id"]) for row in rows],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [dict(row, owner=owner, heartbeat_at=now) for row in rows]
+
+    def heartbeat(self, owner: str, now: float) -> None:
+        """Mark the owner's unfinished jobs as still being worked on."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND finished_at IS NULL",
+                (now, owner),
+            )
+
+    def release(self, owner: str) -> None:
+        """Give up the owner's unfinished jobs so any process may resume them at once."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET owner = NULL, heartbeat_at = NULL WHERE owner = ? AND finished_at IS NULL",
+                (owner,),
+            )
+
+    def delete_finished_before(self, cutoff: float) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -1,8 +1,21 @@
 """Summarize README content into a brainrot-style script."""
 
-import os
-from google import genai
-from google.genai import types
+import functools
+import hashlib
+import threading
+import time
+from typing import TYPE_CHECKING, Callable
+
+from .clients import gemini_client
+from .compactor import compact_readme
+from .hedging import summary_hedger
+from .metrics import SUMMARIZE_ATTEMPTS
+from .quota import QuotaExhausted, gemini_quota, is_retryable
+
+if TYPE_CHECKING:
+    from google import genai
+
+    from .narration import Narrator
 
 
 SYSTEM_PROMPT = """You are a Gen-Z content creator making viral TikTok/YouTube Shorts videos about GitHub repositories.
@@ -28,71 +41,165 @@ Example style:
 CRITICAL: If the input text is short, creatively expand on it by describing the features and potential use cases in detail to ensure the script is at least 100-300 words. Do not simply summarize a short input. YAP about it.
 """
 
+# Model that writes the scripts
+SUMMARY_MODEL = "gemini-2.0-flash-exp"
+
+# Identifies the prompt in script cache keys, so editing SYSTEM_PROMPT
+# invalidates scripts written with the old one
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+
 
-def summarize_readme(readme_content: str, client: genai.Client | None = None) -> str:
+def summarize_readme(
+    readme_content: str,
+    client: "genai.Client | None" = None,
+    narrator: "Narrator | None" = None,
+) -> str:
     """
     Transform a README into a brainrot-style script with retry logic and validation.
+
+    Args:
+        readme_content: README text
+        client: Gemini client (uses the shared pooled client if not provided)
+        narrator: If given, the script is streamed into it as it is generated
+            so speech synthesis starts before the script is finished. Length
+            validation still applies to the whole script; a rejected script
+            is reset out of the narrator.
+
+    With SUMMARY_HEDGE on, an attempt slower than the hedge threshold gets a
+    backup attempt in parallel and the first acceptable script wins (see
+    hedging.Hedger).
+
+    Returns:
+        The script
     """
+    # Imported on first use: the SDK takes about half a second to import
+    from google.genai import types
+
     if client is None:
-        client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+        client = gemini_client()
+
+    # Drop badges, HTML, link URLs and boilerplate sections so the prompt
+    # budget is spent on what the project actually does
+    compacted = compact_readme(readme_content)
+    print(f"  Compacted README: {len(readme_content)} -> {len(compacted)} chars")
+
+    # Only one attempt at a time streams into the narrator; a hedge runs
+    # alongside it without streaming, and takes over the narrator if it wins
+    speaking = threading.Lock()
+
+    def speak(cancelled: threading.Event, action: Callable[[], None]) -> bool:
+        with speaking:
+            if cancelled.is_set():
+                return False
+            action()
+            return True
 
-    import time
-    
-    # Try multiple times to get a valid length script
     # Try multiple times to get a valid length script
     max_attempts = 5
-    for attempt in range(max_attempts):
-        try:
-            # Model switch: Use 2.0 Flash Exp for better stability/compliance
-            # Retry loop for API errors
-            response = None
-            api_retries = 3
-            
-            # Dynamic prompting (Firm but professional)
-            prompt_suffix = ""
-            if attempt > 0:
-                prompt_suffix = f"\n\nPREVIOUS SCRIPT WAS TOO SHORT. PLEASE EXPAND ON THE DETAILS. target 100-300 words. DO NOT BE CONCISE."
-
-            for retry in range(api_retries):
-                try:
-                    response = client.models.generate_content(
-                        model="gemini-2.0-flash-exp",
-                        contents=f"{SYSTEM_PROMPT}\n\nTurn this README into a fast-paced brainrot video script (Target 100-300 words. Approx 40s - 2m duration). Attempt {attempt+1}/{max_attempts}:{prompt_suffix}\n\n{readme_content[:15000]}",
-                        config=types.GenerateContentConfig(
-                            max_output_tokens=2000, 
-                            tools=[],
-                            temperature=1.0, 
-                        ),
-                    )
-                    break # Success
-                except Exception as e:
-                    if "503" in str(e) or "429" in str(e):
-                        print(f"  API Error (503/429): {e}. Retrying in 2s...")
-                        time.sleep(2)
-                    else:
-                        raise e # Fatal error
-            
-            if not response or not response.text:
-                raise ValueError("Empty response from AI")
-
-            script = response.text.strip()
-            word_count = len(script.split())
-            print(f"  Generated script length: {word_count} words")
-
-            # Validation: Ensure it meets the absolute minimum for ~30s (approx 80 words)
-            if word_count >= 80: 
-                return script
-            
-            print(f"  Script too short ({word_count} words). Retrying...")
-            
-        except Exception as e:
-            print(f"  Generation failed: {e}. Retrying...")
-            time.sleep(1)
+
+    def attempt(number: int, hedge: bool, cancelled: threading.Event) -> tuple[str, bool] | None:
+        """One script request. Returns (script, streamed), or None if it was too short."""
+        streams = narrator is not None and not hedge
+
+        # Dynamic prompting (Firm but professional). A hedge has the number of
+        # the attempt it backs up, so both send the same prompt.
+        prompt_suffix = ""
+        if number > 0:
+            prompt_suffix = f"\n\nPREVIOUS SCRIPT WAS TOO SHORT. PLEASE EXPAND ON THE DETAILS. target 100-300 words. DO NOT BE CONCISE."
+
+        contents = f"{SYSTEM_PROMPT}\n\nTurn this README into a fast-paced brainrot video script (Target 100-300 words. Approx 40s - 2m duration). Attempt {number+1}/{max_attempts}:{prompt_suffix}\n\n{compacted}"
+        config = types.GenerateContentConfig(
+            max_output_tokens=2000, 
+            tools=[],
+            temperature=1.0, 
+        )
+
+        # Queued behind the node-wide quota; 429/503 are retried there
+        if not streams:
+            response = gemini_quota.call(
+                SUMMARY_MODEL,
+                "summarize",
+                lambda: client.models.generate_content(model=SUMMARY_MODEL, contents=contents, config=config),
+            )
+            text = response.text if response else None
+        else:
+            text = gemini_quota.call(
+                SUMMARY_MODEL,
+                "summarize",
+                lambda: _stream_script(client, contents, config, lambda action: speak(cancelled, action), narrator),
+            )
+        if cancelled.is_set():
+            # Another attempt already won
+            return None
+
+        if not text:
+            raise ValueError("Empty response from AI")
+
+        script = text.strip()
+        word_count = len(script.split())
+        print(f"  Generated script length: {word_count} words")
+
+        # Validation: Ensure it meets the absolute minimum for ~30s (approx 80 words)
+        if word_count >= 80: 
+            SUMMARIZE_ATTEMPTS.inc(result="accepted")
+            return script, streams
+
+        SUMMARIZE_ATTEMPTS.inc(result="too_short")
+        if streams:
+            speak(cancelled, narrator.reset)
+        print(f"  Script too short ({word_count} words). Retrying...")
+        return None
+
+    def on_error(e: Exception) -> None:
+        SUMMARIZE_ATTEMPTS.inc(result="error")
+        if isinstance(e, QuotaExhausted) or is_retryable(e):
+            # The quota governor already waited and retried; more attempts
+            # would only add load
+            raise e
+        print(f"  Generation failed: {e}. Retrying...")
+        time.sleep(1)
+
+    # A slow attempt may be hedged with a second one running in parallel
+    if result := summary_hedger.run(attempt, max_attempts, on_error):
+        script, streamed = result
+        if narrator is not None and not streamed:
+            # A hedge won; the streaming attempt has been cancelled, so narrate
+            # the winning script instead
+            with speaking:
+                narrator.reset()
+                narrator.feed(script)
+        return script
 
     # NO FALLBACK to short script. Fail explicitly so user knows.
     raise RuntimeError(f"Failed to generate video of sufficient length ({80} words minimum) after {max_attempts} attempts. Please provide more input text or try again.")
 
 
+def _stream_script(
+    client: "genai.Client",
+    contents: str,
+    config,
+    speak: Callable[[Callable[[], None]], bool],
+    narrator: "Narrator",
+) -> str:
+    """
+    Stream one script from Gemini into the narrator and return its full text.
+
+    Narrator calls go through speak, which refuses them once the attempt has
+    been cancelled; the stream is then abandoned.
+    """
+    # A retried stream starts over, so drop whatever the last one produced
+    speak(narrator.reset)
+    parts = []
+    stream = client.models.generate_content_stream(model=SUMMARY_MODEL, contents=contents, config=config)
+    for chunk in stream:
+        if chunk.text:
+            parts.append(chunk.text)
+            if not speak(functools.partial(narrator.feed, chunk.text)):
+                stream.close()
+                break
+    return "".join(parts)
+
+
 if __name__ == "__main__":
     from dotenv import load_dotenv
     load_dotenv()
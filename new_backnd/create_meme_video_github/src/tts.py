@@ -1,12 +1,29 @@
 """Generate speech audio using Gemini TTS."""
 
+import hashlib
+import json
+import logging
 import os
+import re
+import sys
+import tempfile
+import threading
+import unicodedata
 import wave
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from google import genai
-from google.genai import types
+from .cache import DiskCache
+from .clients import gemini_client
+from .quota import QuotaExhausted, gemini_quota, is_retryable
 
+if TYPE_CHECKING:
+    from google import genai
+
+logger = logging.getLogger(__name__)
 
 # Gemini TTS voices with their characteristics
 VOICES = [
@@ -54,8 +71,46 @@ VOICE_MAPPING = {
 
 DEFAULT_VOICE = "Puck"
 
+# Model that reads the scripts
+TTS_MODEL = "gemini-2.5-flash-preview-tts"
+
+# Gemini TTS returns 16-bit mono PCM at this rate
+SAMPLE_RATE = 24000
+
+# Scripts are spoken in chunks of whole sentences of about this many
+# characters, synthesized in parallel. Fewer, longer chunks use less Gemini
+# quota and sound more natural; shorter ones finish sooner.
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "300"))
+
+# The first chunk closes as soon as it has this many characters, so streamed
+# narration starts early
+FIRST_CHUNK_CHARS = 80
+
+# Chunk requests in flight at once in this process, across all jobs
+TTS_WORKERS = max(1, int(os.getenv("TTS_WORKERS", "8")))
+
+# Extra tries for a chunk whose request failed for a reason other than quota
+# (the quota governor already retries 429/503), e.g. a response without audio
+CHUNK_RETRIES = 2
+
+# Overlap between consecutive chunks, so the joins do not click
+CROSSFADE_MS = 20
+
+# End of a sentence: terminal punctuation (plus closing quotes or brackets)
+# followed by whitespace, or a line break
+SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n+")
 
-def _save_wave_file(filename: Path, pcm_data: bytes, channels: int = 1, rate: int = 24000, sample_width: int = 2):
+# Spoken chunks are kept here, keyed by their text, voice and model, so
+# identical text is never sent to Gemini twice. 0 turns the cache off.
+SPEECH_CACHE_DIR = Path(__file__).parent.parent / "output" / "speech"
+SPEECH_CACHE_MAX_MB = int(os.getenv("SPEECH_CACHE_MAX_MB", "512"))
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_speech_cache: DiskCache | None = None
+
+
+def save_wave_file(filename: Path, pcm_data: bytes, channels: int = 1, rate: int = SAMPLE_RATE, sample_width: int = 2):
     """Save PCM data as a wave file."""
     with wave.open(str(filename), "wb") as wf:
         wf.setnchannels(channels)
@@ -64,76 +119,340 @@ def _save_wave_file(filename: Path, pcm_data: bytes, channels: int = 1, rate: in
         wf.writeframes(pcm_data)
 
 
+def resolve_voice(voice: str) -> str:
+    """
+    Map a voice option to a Gemini voice name.
+
+    Raises:
+        ValueError: If the voice is not supported
+    """
+    # Map old OpenAI voice names to Gemini voices
+    voice_name = VOICE_MAPPING.get(voice.lower(), voice)
+
+    # Validate voice
+    if voice_name not in VOICES:
+        raise ValueError(f"Voice must be one of: {VOICES}")
+    return voice_name
+
+
+def synthesize(text: str, voice_name: str, client: "genai.Client | None" = None) -> bytes:
+    """
+    Speak text with Gemini TTS.
+
+    Args:
+        text: The text to convert to speech
+        voice_name: Gemini voice name (see resolve_voice)
+        client: Gemini client (uses the shared pooled client if not provided)
+
+    Returns:
+        Raw 16-bit mono PCM at 24 kHz
+    """
+    # Imported on first use: the SDK takes about half a second to import
+    from google.genai import types
+
+    if client is None:
+        client = gemini_client()
+
+    # Queued behind the node-wide quota; 429/503 are retried there
+    response = gemini_quota.call(
+        TTS_MODEL,
+        "tts",
+        lambda: client.models.generate_content(
+            model=TTS_MODEL,
+            contents=text,
+            config=types.GenerateContentConfig(
+                tools=[],
+                response_modalities=["AUDIO"],
+                speech_config=types.SpeechConfig(
+                    voice_config=types.VoiceConfig(
+                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                            voice_name=voice_name,
+                        )
+                    )
+                ),
+            ),
+        ),
+    )
+
+    # Extract audio data from response
+    return response.candidates[0].content.parts[0].inline_data.data
+
+
+def split_sentences(text: str) -> tuple[list[str], str]:
+    """
+    Split off the complete sentences at the start of text.
+
+    Returns:
+        The complete sentences, and the unfinished remainder
+    """
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    return sentences, text[start:]
+
+
+def group_sentences(sentences: list[str], chunk_chars: int = TTS_CHUNK_CHARS) -> tuple[list[str], list[str]]:
+    """
+    Group sentences into chunks: the first of at least FIRST_CHUNK_CHARS
+    characters, the rest of at least chunk_chars.
+
+    Where a chunk ends depends only on the sentences up to that point, so a
+    script streamed in sentence by sentence and the same script spoken at once
+    are cut into the same chunks and share their speech cache entries.
+
+    Returns:
+        The complete chunks, and the sentences left over after the last one
+    """
+    chunks = []
+    current: list[str] = []
+    size = 0
+    for sentence in sentences:
+        current.append(sentence)
+        size += len(sentence) + 1
+        if size >= (chunk_chars if chunks else FIRST_CHUNK_CHARS):
+            chunks.append(" ".join(current))
+            current, size = [], 0
+    return chunks, current
+
+
+def chunk_script(text: str, chunk_chars: int = TTS_CHUNK_CHARS) -> list[str]:
+    """Group a whole script's sentences into chunks (see group_sentences)."""
+    sentences, rest = split_sentences(text)
+    if rest.strip():
+        sentences.append(rest.strip())
+    chunks, tail = group_sentences(sentences, chunk_chars)
+    if tail:
+        chunks.append(" ".join(tail))
+    return chunks
+
+
+def speech_cache() -> DiskCache | None:
+    """Process-wide PCM cache, opened on first use. None if it is turned off."""
+    global _speech_cache
+    if SPEECH_CACHE_MAX_MB <= 0:
+        return None
+    with _pool_lock:
+        if _speech_cache is None:
+            _speech_cache = DiskCache(SPEECH_CACHE_DIR, max_bytes=SPEECH_CACHE_MAX_MB * 1024 * 1024)
+        return _speech_cache
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of text for the speech cache.
+
+    Unicode variants, typographic quotes and whitespace are folded, since they
+    do not change how the text is read. Case and punctuation are kept: they
+    change emphasis and pauses.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = text.translate(str.maketrans({"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"'}))
+    return " ".join(text.split())
+
+
+def speech_key(text: str, voice_name: str) -> str:
+    """Cache key of a chunk's audio."""
+    return hashlib.sha256(f"{TTS_MODEL}\0{voice_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def synthesize_chunk(text: str, voice_name: str, client: "genai.Client | None" = None) -> bytes:
+    """
+    Speak one chunk, from the speech cache if it has been spoken before.
+
+    A failed chunk is retried on its own. Quota errors are not retried here:
+    the quota governor has already waited and retried them.
+    """
+    cache = speech_cache()
+    key = speech_key(text, voice_name)
+    if cache is not None and (pcm := cache.read(key, ".pcm")) is not None:
+        return pcm
+
+    for attempt in range(CHUNK_RETRIES + 1):
+        try:
+            pcm = synthesize(text, voice_name, client=client)
+            break
+        except Exception as e:
+            if isinstance(e, QuotaExhausted) or is_retryable(e) or attempt == CHUNK_RETRIES:
+                raise
+            logger.warning(f"TTS: Chunk failed ({e}); retrying it")
+
+    if cache is not None:
+        with tempfile.NamedTemporaryFile(dir=cache.root, suffix=".partial", delete=False) as f:
+            f.write(pcm)
+        cache.put(key, {".pcm": Path(f.name)})
+    return pcm
+
+
+def submit_chunk(text: str, voice_name: str, client: "genai.Client | None" = None) -> "Future[bytes]":
+    """Queue a chunk on the process-wide TTS pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(TTS_WORKERS, thread_name_prefix="tts")
+    return _pool.submit(synthesize_chunk, text, voice_name, client)
+
+
+def stitch(chunks: list[bytes], crossfade_ms: int = CROSSFADE_MS) -> tuple[bytes, list[tuple[float, float]]]:
+    """
+    Join PCM chunks, crossfading each join.
+
+    Args:
+        chunks: 16-bit mono PCM at SAMPLE_RATE, in order
+        crossfade_ms: Overlap between consecutive chunks
+
+    Returns:
+        The joined PCM, and the (start, end) of each chunk in it in seconds
+    """
+    fade = SAMPLE_RATE * crossfade_ms // 1000
+    joined = array("h")
+    spans = []
+    for pcm in chunks:
+        samples = array("h")
+        samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+        if sys.byteorder == "big":
+            samples.byteswap()
+        overlap = min(fade, len(joined), len(samples))
+        start = len(joined) - overlap
+        for i in range(overlap):
+            weight = (i + 1) / (overlap + 1)
+            j = start + i
+            joined[j] = int(joined[j] * (1 - weight) + samples[i] * weight)
+        joined.extend(samples[overlap:])
+        # Chunks hand over in the middle of the crossfade
+        boundary = (start + overlap / 2) / SAMPLE_RATE
+        if spans:
+            spans[-1] = (spans[-1][0], boundary)
+        spans.append((boundary, len(joined) / SAMPLE_RATE))
+    if sys.byteorder == "big":
+        joined.byteswap()
+    return joined.tobytes(), spans
+
+
+@dataclass
+class Narration:
+    """
+    Narration audio held in memory, so later stages need not read it back.
+
+    Attributes:
+        pcm: 16-bit mono PCM at SAMPLE_RATE
+        spans: Where each chunk's text is spoken (see span_records), or None
+            for narration stored before speech was chunked
+    """
+
+    pcm: bytes
+    spans: list[dict] | None = None
+
+    @property
+    def duration(self) -> float:
+        """Length in seconds, from the sample count."""
+        return len(self.pcm) / (2 * SAMPLE_RATE)
+
+    def save(self, output_path: str | Path, spans_path: str | Path | None = None) -> None:
+        """Write the WAV file and, if given a path and known, the chunk spans."""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        save_wave_file(output_path, self.pcm)
+        if spans_path is not None and self.spans is not None:
+            Path(spans_path).write_text(json.dumps(self.spans), encoding="utf-8")
+
+    @classmethod
+    def load(cls, audio_path: str | Path, spans_path: str | Path | None = None) -> "Narration":
+        """
+        Read narration written by save().
+
+        Raises:
+            ValueError: If the WAV file is not 16-bit mono at SAMPLE_RATE
+        """
+        with wave.open(str(audio_path), "rb") as wf:
+            if (wf.getnchannels(), wf.getsampwidth(), wf.getframerate()) != (1, 2, SAMPLE_RATE):
+                raise ValueError(f"{audio_path} is not 16-bit mono PCM at {SAMPLE_RATE} Hz")
+            pcm = wf.readframes(wf.getnframes())
+        spans = None
+        if spans_path is not None and Path(spans_path).exists():
+            spans = json.loads(Path(spans_path).read_text(encoding="utf-8"))
+        return cls(pcm, spans)
+
+
+def span_records(texts: list[str], spans: list[tuple[float, float]]) -> list[dict]:
+    """Pair each chunk's text with where it is spoken in the narration."""
+    return [
+        {"text": text, "start": round(start, 3), "end": round(end, 3)}
+        for text, (start, end) in zip(texts, spans)
+    ]
+
+
+def narrate(
+    text: str,
+    voice: str = DEFAULT_VOICE,
+    client: "genai.Client | None" = None,
+    output_path: str | Path | None = None,
+    spans_path: str | Path | None = None,
+) -> Narration:
+    """
+    Generate speech for text using Gemini TTS, kept in memory.
+
+    The text is split into sentence chunks that are synthesized in parallel
+    on a bounded pool and joined with short crossfades. A failed chunk is
+    retried on its own.
+
+    Args:
+        text: The text to convert to speech
+        voice: Voice to use (see VOICES list, or use old OpenAI voice names)
+        client: Gemini client (uses the shared pooled client if not provided)
+        output_path: If given, where to also save the narration as a WAV file
+        spans_path: If given, where to write the time span of each chunk
+            (see span_records)
+
+    Returns:
+        The narration's PCM and chunk spans
+    """
+    voice_name = resolve_voice(voice)
+    texts = chunk_script(text)
+    if not texts:
+        raise ValueError("No text to speak")
+    futures = [submit_chunk(chunk, voice_name, client) for chunk in texts]
+    try:
+        pcm, spans = stitch([future.result() for future in futures])
+    finally:
+        for future in futures:
+            future.cancel()
+    narration = Narration(pcm, span_records(texts, spans))
+    if output_path is not None:
+        narration.save(output_path, spans_path)
+    return narration
+
+
 def generate_speech(
     text: str,
     output_path: str | Path,
     voice: str = DEFAULT_VOICE,
-    client: genai.Client | None = None,
+    client: "genai.Client | None" = None,
+    spans_path: str | Path | None = None,
 ) -> Path:
     """
-    Generate speech audio from text using Gemini TTS.
+    Generate speech audio from text using Gemini TTS and save it (see narrate).
 
     Args:
         text: The text to convert to speech
         output_path: Where to save the audio file (will be saved as .wav)
         voice: Voice to use (see VOICES list, or use old OpenAI voice names)
-        client: Gemini client (creates one if not provided)
+        client: Gemini client (uses the shared pooled client if not provided)
+        spans_path: If given, where to write the time span of each chunk
+            (see span_records)
 
     Returns:
         Path to the generated audio file
     """
-    if client is None:
-        client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-
-    # Map old OpenAI voice names to Gemini voices
-    voice_name = VOICE_MAPPING.get(voice.lower(), voice)
-
-    # Validate voice
-    if voice_name not in VOICES:
-        raise ValueError(f"Voice must be one of: {VOICES}")
-
     output_path = Path(output_path)
     # Gemini TTS outputs WAV format
     if output_path.suffix.lower() == ".mp3":
         output_path = output_path.with_suffix(".wav")
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    import time
-    
-    response = None
-    retries = 3
-    for attempt in range(retries):
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-preview-tts",
-                contents=text,
-                config=types.GenerateContentConfig(
-                    tools=[],
-                    response_modalities=["AUDIO"],
-                    speech_config=types.SpeechConfig(
-                        voice_config=types.VoiceConfig(
-                            prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                voice_name=voice_name,
-                            )
-                        )
-                    ),
-                ),
-            )
-            break
-        except Exception as e:
-            if ("503" in str(e) or "429" in str(e)) and attempt < retries - 1:
-                print(f"  TTS API Error (503/429): {e}. Retrying in 2s...")
-                time.sleep(2)
-                continue
-            raise e
-
-    # Extract audio data from response
-    audio_data = response.candidates[0].content.parts[0].inline_data.data
-
-    # Save as wave file
-    _save_wave_file(output_path, audio_data)
-
+    narrate(text, voice, client, output_path, spans_path)
     return output_path
 
 
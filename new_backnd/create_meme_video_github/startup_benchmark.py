@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Measure how long the API server takes to import, per module.
+
+Runs `python -X importtime -c "import server"` in fresh interpreters and
+reports the slowest modules by cumulative import time, so cold-start
+regressions (an SDK imported at module level again, say) show up in review
+or CI.
+
+    python startup_benchmark.py
+    python startup_benchmark.py --runs 5 --top 15 --max-ms 1000
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.resolve()
+
+# SDKs that should only be imported when a job first needs them
+LAZY_MODULES = ("google.genai", "boto3", "botocore", "requests")
+
+
+def measure(target: str) -> tuple[dict[str, int], set[str]]:
+    """
+    Import target in a fresh interpreter.
+
+    Returns:
+        Cumulative import time per module in microseconds, and the set of
+        lazy SDK modules that were imported anyway
+    """
+    check = "; ".join([
+        f"import {target}",
+        "import sys",
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))",
+    ])
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{result.stderr}")
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+
+    eager = {name for name in result.stdout.strip().split(",") if name}
+    return cumulative, eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server import time")
+    parser.add_argument("--target", default="server", help="Module to import (default: server)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to average over")
+    parser.add_argument("--top", type=int, default=10, help="How many modules to list")
+    parser.add_argument("--max-ms", type=float, help="Fail if the median total exceeds this")
+    args = parser.parse_args()
+
+    runs = []
+    eager = set()
+    for _ in range(args.runs):
+        cumulative, imported = measure(args.target)
+        runs.append(cumulative)
+        eager |= imported
+
+    modules = set().union(*runs)
+    median_ms = {
+        name: statistics.median(run.get(name, 0) for run in runs) / 1000
+        for name in modules
+    }
+    total_ms = median_ms.get(args.target, 0.0)
+
+    print(f"Import time for '{args.target}' (median of {args.runs} runs): {total_ms:.0f} ms\n")
+    print(f"{'cumulative ms':>14}  module")
+    for name, ms in sorted(median_ms.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{ms:>14.1f}  {name}")
+
+    failed = False
+    if eager:
+        print(f"\nFAIL: imported at startup but should be lazy: {', '.join(sorted(eager))}")
+        failed = True
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"\nFAIL: {total_ms:.0f} ms exceeds the {args.max_ms:.0f} ms budget")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
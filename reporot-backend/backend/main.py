@@ -4,11 +4,11 @@ import os
 import time
 import uuid
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 import uvicorn
-from starlette.responses import FileResponse
 
 from services.audio_service import generate_audio, generate_audio_timestamps
+from services.file_service import serve_file
 from services.image_service import download_images
 from services.llm_service import generate_script
 from config import client, default_model
@@ -52,8 +52,13 @@ def read_root():
     return get_dir_videos(output_dir)
 
 @app.get("/videos/{file_id}")
-def read_file(file_id: str):
-    return FileResponse(os.path.join(output_dir, f"{file_id}.mp4"))
+def read_file(file_id: str, request: Request):
+    # Range requests let the player seek without re-downloading, and ETags
+    # turn replays into 304s
+    try:
+        return serve_file(request, os.path.join(output_dir, f"{file_id}.mp4"), "video/mp4")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Video not found")
 
 
 @app.post("/generate")
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+
+from starlette.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+@lru_cache(maxsize=1024)
+def content_hash(path, size, mtime_ns):
+    # size and mtime are part of the cache key so edited files are re-hashed
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+
+    return False
+
+
+def requested_range(request, size, etag, last_modified):
+    """Returns an inclusive (start, end) pair, or None to send the whole file.
+    Raises ValueError when the range cannot be satisfied."""
+    header = request.headers.get("range")
+    if not header:
+        return None
+
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() not in (etag, last_modified):
+        return None
+
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        # Multiple ranges or other units: fall back to the full file
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def iter_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, media_type):
+    """Serve a file with Range/206 support, a strong content-hash ETag and
+    If-None-Match / If-Modified-Since handling."""
+    file = open(path, "rb")
+    stat = os.fstat(file.fileno())
+    etag = f'"{content_hash(str(path), stat.st_size, stat.st_mtime_ns)}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+    }
+
+    if not_modified(request, etag, stat.st_mtime):
+        file.close()
+        return Response(status_code=304, headers=headers)
+
+    size = stat.st_size
+    try:
+        byte_range = requested_range(request, size, etag, last_modified)
+    except ValueError:
+        file.close()
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = end - start + 1 if size else 0
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        iter_range(file, start, length),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )